@@ -4,58 +4,98 @@
 
 import frappe
 from frappe import _
+from frappe.rate_limiter import rate_limit
 import json
 import hmac
 import hashlib
+import time
+
+from redis.exceptions import LockError
+
+from wallee_integration.wallee_integration.api.client import get_settings, is_circuit_open, set_call_priority
+from wallee_integration.wallee_integration.api.metrics import observe
+from wallee_integration.wallee_integration.api.tracing import current_span, get_trace_context, span, traced
+
+
+# Dedicated RQ queue for queued webhook processing (falls back to "short" if not configured)
+WEBHOOK_QUEUE = "wallee_webhooks"
+
+# Number of queued webhook logs loaded per drain iteration
+WEBHOOK_DRAIN_BATCH_SIZE = 100
+
+# How long a delivered event is remembered in Redis to drop retried deliveries
+WEBHOOK_DEDUP_TTL = 24 * 60 * 60
+
+# Minimum delay between two background syncs of a pending webshop checkout
+CHECKOUT_SYNC_INTERVAL = 5
+
+# Checkout status polls accepted per client IP and minute
+CHECKOUT_STATUS_RATE_LIMIT = 30
 
 
 @frappe.whitelist(allow_guest=True)
+@traced()
 def webhook():
     """Handle Wallee webhook notifications"""
     webhook_log = None
+    event_key = None
+
+    # Wallee is the caller here, not a customer
+    set_call_priority("background")
+
     try:
         data = frappe.request.get_data(as_text=True)
         signature = frappe.request.headers.get("X-Signature")
         headers = dict(frappe.request.headers)
 
-        settings = frappe.get_single("Wallee Settings")
+        settings = get_settings()
 
         # Parse payload early for logging
         payload = json.loads(data) if data else {}
 
-        # Create webhook log entry
-        webhook_log = _create_webhook_log(
-            payload=payload,
-            headers=headers,
-            processing_status="Received"
-        )
-
         # Verify webhook signature if secret is configured
         if settings.webhook_secret:
             if not verify_webhook_signature(data, signature, settings.get_password("webhook_secret")):
-                _update_webhook_log(
-                    webhook_log,
+                _create_webhook_log(
+                    payload=payload,
+                    headers=headers,
                     processing_status="Failed",
                     http_status=401,
                     error_message=_("Invalid webhook signature")
                 )
+                # Keep the log even though the request is rolled back
+                frappe.db.commit()
                 frappe.throw(_("Invalid webhook signature"), frappe.AuthenticationError)
 
-        # Process based on event type
-        entity_id = payload.get("entityId")
-        listener_entity_technical_name = payload.get("listenerEntityTechnicalName")
-        space_id = payload.get("spaceId")
-
-        linked_transaction = None
+        # Drop retried deliveries of an event we already accepted
+        event_key = get_webhook_event_key(payload)
+        if event_key and not _claim_webhook_event(event_key):
+            return {"status": "duplicate"}
+
+        try:
+            if settings.webhook_processing == "Queued":
+                # Store the event and acknowledge right away - drain_webhook_queue processes it
+                _create_webhook_log(
+                    payload=payload,
+                    headers=headers,
+                    processing_status="Queued",
+                    event_key=event_key
+                )
+                _enqueue_webhook_drain()
+                return {"status": "queued"}
+
+            # Create webhook log entry
+            webhook_log = _create_webhook_log(
+                payload=payload,
+                headers=headers,
+                processing_status="Received",
+                event_key=event_key
+            )
+        except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+            # Redis entry expired or was lost, but the event is already logged
+            return {"status": "duplicate"}
 
-        if listener_entity_technical_name == "Transaction":
-            linked_transaction = handle_transaction_webhook(entity_id, payload)
-        elif listener_entity_technical_name == "Refund":
-            linked_transaction = handle_refund_webhook(entity_id, payload)
-        elif listener_entity_technical_name == "PaymentTerminal":
-            handle_terminal_webhook(entity_id, payload)
-        elif listener_entity_technical_name == "TransactionCompletion":
-            linked_transaction = handle_completion_webhook(entity_id, payload)
+        linked_transaction = _dispatch_webhook(payload)
 
         # Update webhook log as processed
         _update_webhook_log(
@@ -69,23 +109,361 @@ def webhook():
         return {"status": "success"}
 
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(
             message=str(e),
             title="Wallee Webhook Error"
         )
 
-        if webhook_log:
-            _update_webhook_log(
+        # Handlers commit partway, so the log may already be stored with its event key:
+        # clear it, or the unique index rejects Wallee's retry of this event as a duplicate
+        if webhook_log and frappe.db.exists("Wallee Webhook Log", webhook_log):
+            frappe.db.set_value(
+                "Wallee Webhook Log",
                 webhook_log,
-                processing_status="Failed",
-                http_status=500,
-                error_message=str(e)
+                {
+                    "processing_status": "Failed",
+                    "http_status": 500,
+                    "error_message": str(e),
+                    "event_key": None
+                },
+                update_modified=False
             )
+        frappe.db.commit()
+
+        # Let Wallee's retry of this event through
+        if event_key:
+            _release_webhook_event(event_key)
 
         raise
 
 
-def _create_webhook_log(payload, headers, processing_status="Received"):
+def _dispatch_webhook(payload):
+    """
+    Route a webhook payload to its entity handler.
+
+    Returns:
+        str: Linked transaction document name or None
+    """
+    entity_id = payload.get("entityId")
+    listener_entity_technical_name = payload.get("listenerEntityTechnicalName")
+
+    if listener_entity_technical_name == "Transaction":
+        return handle_transaction_webhook(entity_id, payload)
+    elif listener_entity_technical_name == "Refund":
+        return handle_refund_webhook(entity_id, payload)
+    elif listener_entity_technical_name == "PaymentTerminal":
+        handle_terminal_webhook(entity_id, payload)
+    elif listener_entity_technical_name == "TransactionCompletion":
+        return handle_completion_webhook(entity_id, payload)
+
+    return None
+
+
+def _enqueue_webhook_drain():
+    """Schedule a drain of the webhook queue once the current request commits."""
+    from frappe.utils.background_jobs import get_queue_list
+
+    queue = WEBHOOK_QUEUE if WEBHOOK_QUEUE in get_queue_list() else "short"
+
+    with span("enqueue drain_webhook_queue"):
+        frappe.enqueue(
+            "wallee_integration.api.drain_webhook_queue",
+            queue=queue,
+            job_id=f"wallee_webhook_drain::{frappe.local.site}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            trace_context=get_trace_context()
+        )
+
+
+@traced()
+def drain_webhook_queue():
+    """
+    Process queued webhook events in the order they were received.
+
+    Runs as a background job after each queued webhook and from the scheduler
+    as a safety net. A Redis lock ensures a single drainer per site, so events
+    are handled strictly in arrival order even with several workers.
+
+    Events are collected for the coalescing window (``webhook_coalesce_window``
+    in Wallee Settings) and pending events for the same entity are collapsed
+    into a single fetch-and-update.
+
+    While Wallee calls are suspended by the circuit breaker, events stay
+    queued and are picked up again by the scheduler.
+
+    The job is deduplicated while it runs, so an event queued after the last
+    read would wait for the scheduler: the queue is checked again once the
+    lock is released.
+    """
+    cache = frappe.cache()
+    lock = cache.lock(cache.make_key("wallee_webhook_drain"), timeout=600)
+
+    while lock.acquire(blocking=False):
+        try:
+            _drain_webhooks(lock)
+        finally:
+            _release_lock(lock)
+
+        if is_circuit_open() or not _get_queued_webhooks(limit=1):
+            break
+
+
+def _drain_webhooks(lock):
+    """Process queued webhooks until the queue is empty or Wallee is unavailable."""
+    window = frappe.utils.flt(get_settings().webhook_coalesce_window)
+
+    while not is_circuit_open():
+        pending = _get_queued_webhooks()
+
+        if not pending:
+            break
+
+        try:
+            # Keep the lock for as long as the drain makes progress
+            lock.reacquire()
+        except LockError:
+            frappe.logger("wallee_integration").warning("Wallee webhook drain lost its lock, stopping")
+            break
+
+        # Let a burst for the same entity build up before reading from Wallee
+        age = (frappe.utils.now_datetime() - frappe.utils.get_datetime(pending[0].creation)).total_seconds()
+        if window and age < window:
+            time.sleep(window - age)
+            pending = _get_queued_webhooks()
+
+        for rows in _coalesce_webhooks(pending):
+            if is_circuit_open():
+                break
+            process_webhook_logs(rows)
+
+
+def _release_lock(lock):
+    """Release the drain lock, unless it already expired."""
+    try:
+        lock.release()
+    except LockError:
+        frappe.logger("wallee_integration").warning("Wallee webhook drain lock expired before release")
+
+
+def _get_queued_webhooks(limit=WEBHOOK_DRAIN_BATCH_SIZE):
+    """Get the oldest queued webhook logs, in arrival order."""
+    return frappe.get_all(
+        "Wallee Webhook Log",
+        filters={"processing_status": "Queued"},
+        fields=["name", "request_payload", "creation"],
+        order_by="creation asc",
+        limit=limit
+    )
+
+
+def _coalesce_webhooks(rows):
+    """
+    Group queued webhook logs that resolve to the same local update.
+
+    Handlers always read the current state from Wallee, so one fetch covers
+    every pending event of an entity. Completion events carrying a transaction
+    ID are grouped with that transaction.
+
+    Returns:
+        list: Lists of rows, ordered by the arrival of each group's first event
+    """
+    groups = {}
+
+    for row in rows:
+        payload = _load_payload(row.request_payload)
+        row.payload = payload
+
+        entity_type = payload.get("listenerEntityTechnicalName")
+        entity_id = payload.get("entityId")
+
+        if entity_type == "TransactionCompletion":
+            transaction_id = payload.get("transactionId") or payload.get("transaction_id")
+            if transaction_id:
+                entity_type, entity_id = "Transaction", transaction_id
+
+        if not entity_type or not entity_id:
+            # Cannot be matched to an entity - process on its own
+            groups[row.name] = [row]
+            continue
+
+        groups.setdefault((entity_type, str(entity_id)), []).append(row)
+
+    return list(groups.values())
+
+
+def _load_payload(request_payload):
+    """Parse a stored webhook payload."""
+    if isinstance(request_payload, str):
+        return json.loads(request_payload)
+    return request_payload or {}
+
+
+def process_webhook_logs(rows):
+    """
+    Process stored webhook events that target the same entity with one dispatch.
+
+    The latest event is dispatched; every other event of the group is marked
+    as processed along with it. Completion events grouped under their
+    transaction still clear its cached completions.
+
+    Args:
+        rows: Webhook log rows (name, request_payload, creation) in arrival order
+    """
+    latest = rows[-1]
+    payload = latest.get("payload") or _load_payload(latest.request_payload)
+    coalesced = [row.name for row in rows[:-1]]
+
+    try:
+        _clear_completions_cache(rows[:-1])
+        linked_transaction = _dispatch_webhook(payload)
+        _update_webhook_log(
+            latest.name,
+            processing_status="Processed",
+            http_status=200,
+            linked_transaction=linked_transaction,
+            response_payload={"status": "success", "coalesced": len(coalesced)}
+        )
+
+        if coalesced:
+            frappe.db.set_value(
+                "Wallee Webhook Log",
+                {"name": ["in", coalesced]},
+                {
+                    "processing_status": "Processed",
+                    "http_status": 200,
+                    "linked_transaction": linked_transaction,
+                    "response_payload": frappe.as_json({"status": "coalesced", "into": latest.name})
+                },
+                update_modified=False
+            )
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(
+            message=str(e),
+            title="Wallee Webhook Error"
+        )
+        frappe.db.set_value(
+            "Wallee Webhook Log",
+            {"name": ["in", [row.name for row in rows]]},
+            {
+                "processing_status": "Failed",
+                "http_status": 500,
+                "error_message": str(e),
+                "event_key": None
+            },
+            update_modified=False
+        )
+
+        # Let Wallee's retries of these events through
+        for row in rows:
+            event_key = get_webhook_event_key(row.get("payload") or _load_payload(row.request_payload))
+            if event_key:
+                _release_webhook_event(event_key)
+
+    frappe.db.commit()
+
+    lag = (frappe.utils.now_datetime() - frappe.utils.get_datetime(rows[0].creation)).total_seconds()
+    frappe.cache().set_value("wallee_webhook_last_lag", round(lag, 3))
+    observe("wallee_webhook_lag_seconds", lag)
+
+
+def _clear_completions_cache(rows):
+    """Clear the cached completions of the transactions of Completion events that are not dispatched."""
+    from wallee_integration.wallee_integration.api.transaction import clear_transaction_completions_cache
+
+    transaction_ids = set()
+    for row in rows:
+        payload = row.get("payload") or _load_payload(row.request_payload)
+        if payload.get("listenerEntityTechnicalName") != "TransactionCompletion":
+            continue
+
+        transaction_id = payload.get("transactionId") or payload.get("transaction_id")
+        if transaction_id:
+            transaction_ids.add(str(transaction_id))
+
+    for transaction_id in transaction_ids:
+        clear_transaction_completions_cache(transaction_id)
+
+
+@frappe.whitelist()
+def get_webhook_queue_stats():
+    """
+    Get queued webhook processing metrics.
+
+    Returns:
+        dict: {depth, oldest_lag, last_lag}
+            - depth: Number of events waiting to be processed
+            - oldest_lag: Age in seconds of the oldest waiting event
+            - last_lag: Seconds between receipt and processing of the last event
+    """
+    frappe.only_for("System Manager")
+
+    return _get_webhook_queue_stats()
+
+
+def _get_webhook_queue_stats():
+    filters = {"processing_status": "Queued"}
+    depth = frappe.db.count("Wallee Webhook Log", filters)
+
+    oldest_lag = 0
+    if depth:
+        oldest = frappe.db.get_value("Wallee Webhook Log", filters, "creation", order_by="creation asc")
+        oldest_lag = round((frappe.utils.now_datetime() - frappe.utils.get_datetime(oldest)).total_seconds(), 3)
+
+    return {
+        "depth": depth,
+        "oldest_lag": oldest_lag,
+        "last_lag": frappe.cache().get_value("wallee_webhook_last_lag") or 0
+    }
+
+
+def get_webhook_event_key(payload):
+    """
+    Build the identity of a Wallee webhook event.
+
+    Retried deliveries of the same event share this key.
+
+    Args:
+        payload: Webhook payload dict
+
+    Returns:
+        str: "space:listener:entity:state-or-timestamp", or None if the
+            payload does not carry enough information
+    """
+    entity_id = payload.get("entityId")
+    version = payload.get("state") or payload.get("timestamp")
+
+    if not entity_id or not version:
+        return None
+
+    return ":".join(str(part) for part in (
+        payload.get("spaceId") or "",
+        payload.get("listenerEntityId") or "",
+        entity_id,
+        version
+    ))
+
+
+def _claim_webhook_event(event_key):
+    """
+    Atomically mark a webhook event as seen.
+
+    Returns:
+        bool: True if the event is new, False if it was already delivered
+    """
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(f"wallee_webhook_event:{event_key}"), 1, ex=WEBHOOK_DEDUP_TTL, nx=True))
+
+
+def _release_webhook_event(event_key):
+    """Forget a webhook event so a retried delivery is processed again."""
+    cache = frappe.cache()
+    cache.delete(cache.make_key(f"wallee_webhook_event:{event_key}"))
+
+
+def _create_webhook_log(payload, headers, processing_status="Received", http_status=None, error_message=None, event_key=None):
     """
     Create a webhook log entry.
 
@@ -93,6 +471,9 @@ def _create_webhook_log(payload, headers, processing_status="Received"):
         payload: Webhook payload dict
         headers: HTTP headers dict
         processing_status: Initial status
+        http_status: HTTP response code, if already known
+        error_message: Error message, if already known
+        event_key: Unique identity of the event (see get_webhook_event_key)
 
     Returns:
         str: Name of the created webhook log document
@@ -129,7 +510,10 @@ def _create_webhook_log(payload, headers, processing_status="Received"):
         listener_entity_id=listener_entity_id,
         request_headers=headers,
         request_payload=payload,
-        processing_status=processing_status
+        processing_status=processing_status,
+        http_status=http_status,
+        error_message=error_message,
+        event_key=event_key
     )
 
     return log.name
@@ -176,10 +560,13 @@ def handle_transaction_webhook(transaction_id, payload):
         "name"
     )
 
+    current_span().set_transaction(transaction_id)
+
     if local_transaction:
         doc = frappe.get_doc("Wallee Transaction", local_transaction)
         wallee_data = get_full_transaction(transaction_id)
-        update_transaction_from_wallee(doc, wallee_data)
+        with span("db save Wallee Transaction", transaction_id=transaction_id):
+            update_transaction_from_wallee(doc, wallee_data)
         return local_transaction
 
     return None
@@ -210,9 +597,12 @@ def handle_refund_webhook(refund_id, payload):
                 "name"
             )
 
+            current_span().set_transaction(transaction_id)
+
             if local_transaction:
                 doc = frappe.get_doc("Wallee Transaction", local_transaction)
-                update_refund_from_wallee(doc, refund_data)
+                with span("db save Wallee Transaction", transaction_id=transaction_id, **{"wallee.refund_id": str(refund_id)}):
+                    update_refund_from_wallee(doc, refund_data)
                 return local_transaction
 
     return None
@@ -238,7 +628,10 @@ def handle_completion_webhook(completion_id, payload):
     Returns:
         str: Linked transaction document name or None
     """
-    from wallee_integration.wallee_integration.api.transaction import get_full_transaction
+    from wallee_integration.wallee_integration.api.transaction import (
+        clear_transaction_completions_cache,
+        get_full_transaction
+    )
 
     # Get transaction ID from payload
     transaction_id = payload.get("transactionId") or payload.get("transaction_id")
@@ -249,6 +642,9 @@ def handle_completion_webhook(completion_id, payload):
         # For now, skip if we can't determine the transaction
         return None
 
+    current_span().set_transaction(transaction_id)
+    clear_transaction_completions_cache(transaction_id)
+
     local_transaction = frappe.db.get_value(
         "Wallee Transaction",
         {"transaction_id": str(transaction_id)},
@@ -262,7 +658,8 @@ def handle_completion_webhook(completion_id, payload):
 
         doc = frappe.get_doc("Wallee Transaction", local_transaction)
         wallee_data = get_full_transaction(transaction_id)
-        update_transaction_from_wallee(doc, wallee_data)
+        with span("db save Wallee Transaction", transaction_id=transaction_id):
+            update_transaction_from_wallee(doc, wallee_data)
         return local_transaction
 
     return None
@@ -271,6 +668,7 @@ def handle_completion_webhook(completion_id, payload):
 # Webshop Payment Controller Integration
 
 @frappe.whitelist()
+@traced()
 def create_webshop_payment(cart_items, currency, success_url=None, failed_url=None, customer=None):
     """
     Create a payment for webshop checkout
@@ -293,7 +691,7 @@ def create_webshop_payment(cart_items, currency, success_url=None, failed_url=No
         create_transaction_record
     )
 
-    settings = frappe.get_single("Wallee Settings")
+    settings = get_settings()
 
     if not settings.enabled or not settings.enable_webshop:
         frappe.throw(_("Webshop payments are not enabled"))
@@ -379,3 +777,130 @@ def sync_transaction(transaction_name):
         "name": doc.name,
         "status": doc.status
     }
+
+
+@frappe.whitelist(allow_guest=True)
+@rate_limit(limit=CHECKOUT_STATUS_RATE_LIMIT, seconds=60)
+@traced()
+def get_checkout_status(payment_request):
+    """
+    Get the state of a webshop checkout, polled by the /wallee/success page.
+
+    Only reads local records: confirmation from Wallee happens in a background
+    job, so the request returns immediately. Guests can call it, so it is
+    rate-limited per IP (the calls may queue a sync or confirm the order) and
+    returns no record names or error details.
+
+    Returns:
+        dict: {status: pending|success|failed|error, redirect_to}
+    """
+    result = get_checkout_result(payment_request)
+    return {"status": result["status"], "redirect_to": result["redirect_to"]}
+
+
+def get_checkout_result(payment_request_name):
+    """
+    Resolve the state of a webshop checkout.
+
+    Once the Wallee Transaction is paid the order is created through the
+    webshop payment handler; while it is pending a background sync is queued.
+    """
+    from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+        COMPLETED_STATUSES,
+        FAILED_STATUSES
+    )
+
+    result = {"status": "pending", "redirect_to": None, "error": None, "transaction": None, "payment_request": None}
+
+    pr = frappe.db.get_value(
+        "Payment Request",
+        payment_request_name,
+        ["name", "status", "reference_doctype", "reference_name"],
+        as_dict=True
+    ) if payment_request_name else None
+
+    if not pr:
+        result.update(status="error", error=_("Payment request not found"))
+        return result
+
+    result["payment_request"] = pr.name
+
+    if pr.status in ["Paid", "Completed"] and pr.reference_doctype == "Sales Order":
+        result.update(status="success", redirect_to=f"/thank_you?sales_order={pr.reference_name}")
+        return result
+
+    transaction = frappe.db.get_value(
+        "Wallee Transaction",
+        {"payment_request": payment_request_name},
+        ["name", "status", "failure_reason"],
+        as_dict=True
+    )
+
+    if not transaction:
+        result.update(status="error", error=_("Transaction record not found"))
+        return result
+
+    result["transaction"] = transaction.name
+
+    if transaction.status in COMPLETED_STATUSES:
+        return _confirm_checkout(pr, result)
+
+    if transaction.status in FAILED_STATUSES:
+        result.update(status="failed", error=transaction.failure_reason or _("Payment was declined"))
+        return result
+
+    _enqueue_checkout_sync(transaction.name)
+    return result
+
+
+def _confirm_checkout(pr, result):
+    """Create the order for a paid checkout, once."""
+    cache = frappe.cache()
+    lock = cache.lock(cache.make_key(f"wallee_checkout:{pr.name}"), timeout=120)
+
+    # Another request is already confirming this checkout
+    if not lock.acquire(blocking=False):
+        return result
+
+    try:
+        from webshop.controllers.payment_handler import handle_payment_success
+
+        response = handle_payment_success(payment_request_id=pr.name)
+
+        if response and response.get("status") == "success":
+            redirect_to = response.get("redirect_to")
+            if not redirect_to and pr.reference_doctype == "Sales Order":
+                redirect_to = f"/thank_you?sales_order={pr.reference_name}"
+
+            result.update(status="success", redirect_to=redirect_to)
+        else:
+            result.update(
+                status="error",
+                error=response.get("message") if response else _("Error processing payment")
+            )
+    except Exception:
+        frappe.log_error(title=f"Wallee Checkout Error: {pr.name}")
+        result.update(status="error", error=_("Error creating order. Please contact support."))
+    finally:
+        lock.release()
+
+    return result
+
+
+def _enqueue_checkout_sync(transaction_name):
+    """Queue a status sync for a pending checkout, at most every CHECKOUT_SYNC_INTERVAL seconds."""
+    cache = frappe.cache()
+
+    if not cache.set(cache.make_key(f"wallee_checkout_sync:{transaction_name}"), 1, ex=CHECKOUT_SYNC_INTERVAL, nx=True):
+        return
+
+    with span("enqueue sync_transaction_status"):
+        frappe.enqueue(
+            "wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction.sync_transaction_status",
+            queue="short",
+            job_id=f"wallee_checkout_sync::{transaction_name}",
+            deduplicate=True,
+            transaction_name=transaction_name,
+            # The customer is waiting on the success page
+            priority="interactive"
+        )
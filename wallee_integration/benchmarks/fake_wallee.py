@@ -0,0 +1,651 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+In-memory stand-in for the Wallee REST API, for offline load tests.
+
+Serves the endpoints this app calls through ``client.call_api`` (transactions,
+search, payment page URLs, completions, invoices, refunds and payment
+terminals) with JSON shaped like Wallee's, so the SDK deserialises it into the
+usual models. Latency and error injection are configurable per server and can
+be changed while it runs. Routes the app calls but the fake does not know are
+answered with 404 and counted under "unmatched" in the stats, so a mismatch
+with the installed SDK shows up in the benchmark report instead of skewing it.
+
+Only the Python standard library is used: the server runs inside a bench
+process (see benchmarks.load) or on its own:
+
+	python -m wallee_integration.benchmarks.fake_wallee --port 8765 --latency 0.05 --error-rate 0.01
+
+then point **API Host** in Wallee Settings to ``http://127.0.0.1:8765/api/v2.0``.
+"""
+
+import argparse
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+API_PREFIX = "/api/v2.0"
+
+# States a transaction moves through once the customer paid
+PAID_STATES = ("AUTHORIZED", "COMPLETED", "FULFILL")
+
+
+class FakeWallee:
+	"""
+	Fake Wallee space served over HTTP from a background thread.
+
+	Args:
+		host: Interface to bind
+		port: Port to bind, 0 picks a free one
+		latency: Seconds added to every response
+		jitter: Random extra latency, up to this many seconds
+		error_rate: Share of requests answered with error_status (0..1)
+		error_status: HTTP status of injected errors (503, 429, ...)
+		terminal_delay: Seconds perform-transaction takes, i.e. the time the
+			customer needs to present a card
+	"""
+
+	def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+			error_status=503, terminal_delay=1.0):
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.error_status = error_status
+		self.terminal_delay = terminal_delay
+
+		self.transactions = {}
+		self.completions = {}
+		self.invoices = {}
+		self.refunds = {}
+		self.terminals = {}
+
+		self.stats = Counter()
+		self.lock = threading.Lock()
+		self._ids = itertools.count(int(time.time()) * 10)
+
+		self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+		self.httpd.daemon_threads = True
+		self.thread = None
+
+		self.add_terminal("Benchmark Terminal")
+
+	@property
+	def url(self):
+		"""Value for the API Host setting."""
+		host, port = self.httpd.server_address[:2]
+		return f"http://{host}:{port}{API_PREFIX}"
+
+	def start(self):
+		self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-wallee", daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+	# State helpers, usable from the benchmark runner
+
+	def next_id(self):
+		return next(self._ids)
+
+	def add_terminal(self, name):
+		terminal_id = self.next_id()
+		self.terminals[terminal_id] = {
+			"id": terminal_id,
+			"name": name,
+			"identifier": f"T{terminal_id}",
+			"state": "ACTIVE",
+			"version": 1,
+			"type": {"id": 1, "name": "Fake Terminal"},
+		}
+		return terminal_id
+
+	def create_transaction(self, data=None):
+		"""Store a new transaction from a TransactionCreate payload and return it."""
+		data = data or {}
+		transaction_id = self.next_id()
+		line_items = [_line_item(item) for item in data.get("lineItems") or []]
+		amount = round(sum(item["amountIncludingTax"] for item in line_items), 2)
+
+		tx = {
+			"id": transaction_id,
+			"version": 1,
+			"state": "CONFIRMED" if data.get("autoConfirmationEnabled", True) else "PENDING",
+			"currency": data.get("currency") or "CHF",
+			"merchantReference": data.get("merchantReference"),
+			"customerId": data.get("customerId"),
+			"customerEmailAddress": data.get("customerEmailAddress"),
+			"successUrl": data.get("successUrl"),
+			"failedUrl": data.get("failedUrl"),
+			"lineItems": line_items,
+			"authorizationAmount": amount,
+			"completedAmount": 0,
+			"refundedAmount": 0,
+			"totalAppliedFees": 0,
+			"totalSettledAmount": 0,
+			"authorizationEnvironment": "TEST",
+			"customersPresence": "VIRTUAL_PRESENT",
+			"userInterfaceType": "PAYMENT_PAGE",
+			"createdOn": _now(),
+			"stateChangedOn": _now(),
+			"completions": [],
+		}
+
+		with self.lock:
+			self.transactions[transaction_id] = tx
+
+		return tx
+
+	def set_state(self, transaction_id, state):
+		"""Move a transaction to a Wallee state, as the payment page or terminal would."""
+		with self.lock:
+			tx = self.transactions[int(transaction_id)]
+			tx["state"] = state
+			tx["version"] += 1
+			tx["stateChangedOn"] = _now()
+
+			if state in PAID_STATES and not tx.get("authorizedOn"):
+				tx["authorizedOn"] = _now()
+				tx["token"] = {"tokenizedPaymentMethod": {
+					"brand": "Visa", "lastDigits": "4242", "holderName": "Bench Customer",
+					"expiryMonth": 12, "expiryYear": 2030,
+				}}
+
+			if state in ("COMPLETED", "FULFILL") and not tx.get("completedOn"):
+				self._complete(tx)
+
+			return tx
+
+	def touch(self, transaction_ids):
+		"""Bump the version of transactions without changing their state."""
+		with self.lock:
+			for transaction_id in transaction_ids:
+				tx = self.transactions[int(transaction_id)]
+				tx["version"] += 1
+				tx["stateChangedOn"] = _now()
+
+	def _complete(self, tx):
+		tx["completedOn"] = _now()
+		tx["completedAmount"] = tx["authorizationAmount"]
+		tx["totalAppliedFees"] = round(tx["authorizationAmount"] * 0.015, 2)
+
+		completion = {
+			"id": self.next_id(),
+			"linkedTransaction": tx["id"],
+			"state": "SUCCESSFUL",
+			"amount": tx["authorizationAmount"],
+			"statementDescriptor": "FAKE WALLEE",
+			"processorReference": f"P{tx['id']}",
+			"createdOn": _now(),
+		}
+		tx["completions"].append(completion)
+		self.completions[completion["id"]] = completion
+
+		invoice = {
+			"id": self.next_id(),
+			"linkedTransaction": tx["id"],
+			"state": "PAID",
+			"amount": tx["authorizationAmount"],
+			"lineItems": tx["lineItems"],
+			"createdOn": _now(),
+		}
+		self.invoices[invoice["id"]] = invoice
+
+	# Webhooks
+
+	def webhook_payload(self, transaction_id, entity="Transaction"):
+		tx = self.transactions[int(transaction_id)]
+		return {
+			"eventId": self.next_id(),
+			"entityId": tx["id"],
+			"listenerEntityTechnicalName": entity,
+			"spaceId": 1,
+			"state": tx["state"],
+			"timestamp": _now(),
+		}
+
+	def send_webhooks(self, url, payloads, concurrency=10, secret=None, timeout=30):
+		"""
+		POST webhook payloads to the site, like Wallee's notification service.
+
+		Returns:
+			list: (seconds, HTTP status or exception) per delivery
+		"""
+		def deliver(payload):
+			body = json.dumps(payload).encode()
+			headers = {"Content-Type": "application/json"}
+			if secret:
+				headers["X-Signature"] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+			request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+			start = time.perf_counter()
+			try:
+				with urllib.request.urlopen(request, timeout=timeout) as response:
+					status = response.status
+			except urllib.error.HTTPError as e:
+				status = e.code
+			except Exception as e:
+				status = e
+			return time.perf_counter() - start, status
+
+		with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+			return list(executor.map(deliver, payloads))
+
+	# Request handling
+
+	def handle(self, method, path, query, body):
+		"""Route one request, return (status, payload)."""
+		for route_method, pattern, handler in ROUTES:
+			if route_method != method:
+				continue
+			match = pattern.fullmatch(path)
+			if match:
+				self._count(handler.__name__)
+				return handler(self, query, body, *match.groups())
+
+		self._count(f"unmatched {method} {path}")
+		return 404, {"message": f"No fake route for {method} {path}"}
+
+	def inject(self):
+		"""Apply latency and return an injected (status, payload) error, if any."""
+		delay = self.latency + random.uniform(0, self.jitter) if self.jitter else self.latency
+		if delay:
+			time.sleep(delay)
+
+		if self.error_rate and random.random() < self.error_rate:
+			self._count(f"injected {self.error_status}")
+			return self.error_status, {"message": "Injected error"}
+
+		return None
+
+	def _count(self, key):
+		with self.lock:
+			self.stats[key] += 1
+
+	def _get(self, collection, entity_id):
+		entity = collection.get(int(entity_id))
+		if entity is None:
+			return 404, {"message": f"Entity {entity_id} not found"}
+		return 200, entity
+
+	def _search(self, entities, query, body=None):
+		if body and "filter" in (body or {}):
+			entities = [e for e in entities if _match_entity_filter(e, body.get("filter"))]
+			limit = int(body.get("numberOfEntities") or 100)
+			offset = int(body.get("startingEntity") or 0)
+			order = " ".join(
+				"{0} {1}".format(o.get("fieldName"), o.get("sorting", "ASC"))
+				for o in body.get("orderBys") or []
+			)
+			return 200, _sort(entities, order)[offset:offset + limit]
+
+		entities = [e for e in entities if _match_query(e, _param(query, "query"))]
+		limit = int(_param(query, "limit") or 100)
+		offset = int(_param(query, "offset") or 0)
+		page = _sort(entities, _param(query, "order"))[offset:offset + limit]
+
+		return 200, {"data": page, "limit": limit, "offset": offset, "hasMore": offset + limit < len(entities)}
+
+
+# Route handlers: handler(fake, query, body, *path groups) -> (status, payload)
+
+def create_transaction(fake, query, body):
+	return 200, fake.create_transaction(body)
+
+
+def read_transaction(fake, query, body, transaction_id):
+	return fake._get(fake.transactions, transaction_id)
+
+
+def search_transactions(fake, query, body):
+	return fake._search(list(fake.transactions.values()), query)
+
+
+def list_transactions(fake, query, body):
+	return 200, {"data": list(fake.transactions.values())[:100], "hasMore": len(fake.transactions) > 100}
+
+
+def payment_page_url(fake, query, body, transaction_id):
+	return 200, f"{fake.url}/fake/payment-page/{transaction_id}"
+
+
+def javascript_url(fake, query, body, transaction_id, kind):
+	return 200, f"{fake.url}/fake/{kind}/{transaction_id}.js"
+
+
+def payment_method_configurations(fake, query, body, transaction_id):
+	return 200, [{"id": 1, "name": "Card", "state": "ACTIVE"}]
+
+
+def complete_transaction(fake, query, body, transaction_id):
+	return 200, fake.set_state(transaction_id, "COMPLETED")
+
+
+def void_transaction(fake, query, body, transaction_id):
+	return 200, fake.set_state(transaction_id, "VOIDED")
+
+
+def search_completions(fake, query, body):
+	return fake._search(list(fake.completions.values()), query)
+
+
+def search_invoices(fake, query, body):
+	return fake._search(list(fake.invoices.values()), query)
+
+
+def read_invoice(fake, query, body, invoice_id):
+	return fake._get(fake.invoices, invoice_id)
+
+
+def replace_invoice(fake, query, body, invoice_id):
+	status, invoice = fake._get(fake.invoices, invoice_id)
+	if status != 200:
+		return status, invoice
+
+	replacement = dict(invoice, id=fake.next_id(), lineItems=(body or {}).get("lineItems") or invoice["lineItems"])
+	invoice["state"] = "DERECOGNIZED"
+	fake.invoices[replacement["id"]] = replacement
+	return 200, replacement
+
+
+def create_refund(fake, query, body):
+	body = body or {}
+	transaction_id = body.get("transaction")
+	status, tx = fake._get(fake.transactions, transaction_id)
+	if status != 200:
+		return status, tx
+
+	refund = {
+		"id": fake.next_id(),
+		"transaction": {"id": tx["id"]},
+		"state": "SUCCESSFUL",
+		"amount": body.get("amount"),
+		"externalId": body.get("externalId"),
+		"type": body.get("type"),
+		"processorReference": f"R{tx['id']}",
+		"succeededOn": _now(),
+		"createdOn": _now(),
+	}
+
+	with fake.lock:
+		fake.refunds[refund["id"]] = refund
+		tx["refundedAmount"] = round(tx["refundedAmount"] + (refund["amount"] or 0), 2)
+		tx["version"] += 1
+
+	return 200, refund
+
+
+def read_refund(fake, query, body, refund_id=None):
+	return fake._get(fake.refunds, refund_id or _param(query, "id"))
+
+
+def search_refunds(fake, query, body):
+	return fake._search(list(fake.refunds.values()), query, body)
+
+
+def list_terminals(fake, query, body):
+	return 200, {"data": list(fake.terminals.values()), "hasMore": False}
+
+
+def read_terminal(fake, query, body, terminal_id):
+	return fake._get(fake.terminals, terminal_id)
+
+
+def perform_terminal_transaction(fake, query, body, terminal_id, transaction_id=None):
+	transaction_id = transaction_id or _param(query, "transactionId")
+	if int(transaction_id) not in fake.transactions:
+		return 404, {"message": f"Entity {transaction_id} not found"}
+
+	fake.set_state(transaction_id, "PROCESSING")
+	time.sleep(fake.terminal_delay)
+
+	tx = fake.set_state(transaction_id, "AUTHORIZED")
+	tx["userInterfaceType"] = "TERMINAL"
+	tx["terminal"] = fake.terminals.get(int(terminal_id))
+	return 200, tx
+
+
+def trigger_final_balance(fake, query, body, terminal_id):
+	return 200, {"id": fake.next_id(), "state": "SUCCESSFUL", "createdOn": _now()}
+
+
+def till_connection_credentials(fake, query, body, terminal_id, transaction_id=None):
+	return 200, f"fake-till-token-{terminal_id}"
+
+
+_TERMINALS = r"/payment[-/]terminals"
+_REFUNDS = r"(?:/payment)?/refunds?"
+
+ROUTES = [
+	(method, re.compile(pattern), handler)
+	for method, pattern, handler in (
+		("POST", r"/payment/transactions", create_transaction),
+		("GET", r"/payment/transactions", list_transactions),
+		("GET", r"/payment/transactions/search", search_transactions),
+		("GET", r"/payment/transactions/invoices/search", search_invoices),
+		("GET", r"/payment/transactions/invoices/(\d+)", read_invoice),
+		("POST", r"/payment/transactions/invoices/(\d+)/replace", replace_invoice),
+		("GET", r"/payment/transactions/(\d+)", read_transaction),
+		("GET", r"/payment/transactions/(\d+)/payment-page-url", payment_page_url),
+		("GET", r"/payment/transactions/(\d+)/(lightbox|iframe)-javascript-url", javascript_url),
+		("GET", r"/payment/transactions/(\d+)/payment-method-configurations", payment_method_configurations),
+		("POST", r"/payment/transactions/(\d+)/complete-online", complete_transaction),
+		("POST", r"/payment/transactions/(\d+)/void-online", void_transaction),
+		("GET", r"/payment/transaction-completions?/search", search_completions),
+		("GET", r"/payment/transactions/completions/search", search_completions),
+		("POST", _REFUNDS, create_refund),
+		("POST", _REFUNDS + r"/refund", create_refund),
+		("GET", _REFUNDS + r"/(\d+)", read_refund),
+		("GET", _REFUNDS + r"/read", read_refund),
+		("GET", _REFUNDS + r"/search", search_refunds),
+		("POST", _REFUNDS + r"/search", search_refunds),
+		("GET", _TERMINALS, list_terminals),
+		("GET", _TERMINALS + r"/(\d+)", read_terminal),
+		("POST", _TERMINALS + r"/(\d+)/perform-transaction", perform_terminal_transaction),
+		("POST", _TERMINALS + r"/(\d+)/perform-transaction/(\d+)", perform_terminal_transaction),
+		("POST", _TERMINALS + r"/(\d+)/trigger-final-balance", trigger_final_balance),
+		("GET", _TERMINALS + r"/(\d+)/till-connection-credentials", till_connection_credentials),
+		("GET", _TERMINALS + r"/(\d+)/till-connection-credentials/(\d+)", till_connection_credentials),
+	)
+]
+
+
+def _make_handler(fake):
+	class Handler(BaseHTTPRequestHandler):
+		protocol_version = "HTTP/1.1"
+
+		def do_GET(self):
+			self._dispatch("GET")
+
+		def do_POST(self):
+			self._dispatch("POST")
+
+		def do_DELETE(self):
+			self._dispatch("DELETE")
+
+		def _dispatch(self, method):
+			url = urlparse(self.path)
+			path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+			query = parse_qs(url.query)
+
+			length = int(self.headers.get("Content-Length") or 0)
+			raw = self.rfile.read(length) if length else b""
+
+			result = fake.inject()
+			if result is None:
+				try:
+					result = fake.handle(method, path.rstrip("/"), query, json.loads(raw) if raw else None)
+				except Exception as e:
+					fake._count("server errors")
+					result = 500, {"message": str(e)}
+
+			status, payload = result
+			data = json.dumps(payload).encode()
+
+			self.send_response(status)
+			self.send_header("Content-Type", "application/json")
+			self.send_header("Content-Length", str(len(data)))
+			if status == 429:
+				self.send_header("Retry-After", "1")
+			self.end_headers()
+			self.wfile.write(data)
+
+		def log_message(self, format, *args):
+			pass
+
+	return Handler
+
+
+def _now():
+	return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _line_item(item):
+	amount = float(item.get("amountIncludingTax") or 0)
+	quantity = float(item.get("quantity") or 1)
+	return {
+		"name": item.get("name"),
+		"uniqueId": item.get("uniqueId"),
+		"sku": item.get("sku"),
+		"quantity": quantity,
+		"amountIncludingTax": amount,
+		"unitPriceIncludingTax": round(amount / quantity, 2) if quantity else amount,
+		"taxAmount": 0,
+		"discountIncludingTax": 0,
+		"type": item.get("type") or "PRODUCT",
+	}
+
+
+def _param(query, name):
+	values = query.get(name)
+	return values[0] if values else None
+
+
+def _sort(entities, order):
+	"""Sort by a Wallee order expression like "id DESC" (only the first field is used)."""
+	if not order:
+		return entities
+
+	field, _, direction = order.partition(" ")
+	return sorted(entities, key=lambda e: (e.get(field) is None, e.get(field)), reverse=direction.upper() == "DESC")
+
+
+def _match_query(entity, query):
+	"""
+	Evaluate a Wallee search query: terms joined by AND, each ``field:value``,
+	``field:>value``, ``field:>=value`` (and < / <=) or ``field:(a OR b)``.
+	"""
+	if not query:
+		return True
+
+	for term in query.split(" AND "):
+		field, _, condition = term.strip().partition(":")
+		value = entity.get(field)
+		if isinstance(value, dict):
+			value = value.get("id")
+
+		if condition.startswith("(") and condition.endswith(")"):
+			options = [option.strip() for option in condition[1:-1].split(" OR ")]
+			if str(value) not in options:
+				return False
+			continue
+
+		operator = re.match(r"[<>]=?", condition)
+		operator = operator.group(0) if operator else ""
+		expected = condition[len(operator):]
+
+		if not _compare(value, operator, expected):
+			return False
+
+	return True
+
+
+def _compare(value, operator, expected):
+	if value is None:
+		return False
+
+	if isinstance(value, (int, float)):
+		expected = float(expected)
+	else:
+		value, expected = str(value), str(expected)
+
+	if operator == ">":
+		return value > expected
+	if operator == ">=":
+		return value >= expected
+	if operator == "<":
+		return value < expected
+	if operator == "<=":
+		return value <= expected
+	return value == expected
+
+
+def _match_entity_filter(entity, entity_filter):
+	"""Evaluate an EntityQuery filter (LEAF, AND, OR) as sent by the refund search."""
+	if not entity_filter:
+		return True
+
+	filter_type = entity_filter.get("type")
+	children = entity_filter.get("children") or []
+
+	if filter_type == "AND":
+		return all(_match_entity_filter(entity, child) for child in children)
+	if filter_type == "OR":
+		return any(_match_entity_filter(entity, child) for child in children)
+
+	operators = {"EQUALS": "", "GREATER_THAN": ">", "GREATER_THAN_OR_EQUAL": ">=", "LESS_THAN": "<", "LESS_THAN_OR_EQUAL": "<="}
+	value = entity.get(entity_filter.get("fieldName"))
+	if isinstance(value, dict):
+		value = value.get("id")
+
+	return _compare(value, operators.get(entity_filter.get("operator"), ""), entity_filter.get("value"))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run a fake Wallee API for load tests")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8765)
+	parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+	parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency in seconds")
+	parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with --error-status")
+	parser.add_argument("--error-status", type=int, default=503)
+	parser.add_argument("--terminal-delay", type=float, default=1.0, help="seconds a terminal payment takes")
+	args = parser.parse_args()
+
+	fake = FakeWallee(
+		args.host, args.port, args.latency, args.jitter, args.error_rate,
+		args.error_status, args.terminal_delay
+	)
+	print(f"Fake Wallee API listening on {fake.url}")
+
+	try:
+		fake.httpd.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		print(json.dumps(dict(fake.stats), indent=1))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,254 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+Micro-benchmarks for the per-event transaction update path.
+
+Times each step of handle_transaction_webhook -> get_full_transaction ->
+update_transaction_from_wallee -> _update_card_details /
+_update_completion_details / _update_line_items -> save -> commit, for
+synthetic transactions with a growing number of line items and
+completions, and records the peak memory allocated per call.
+
+Synthetic transactions are built from the fake Wallee API's JSON (see
+fake_wallee), as attribute objects shaped like the SDK's Transaction. The
+webhook step reads them over HTTP from an in-process fake server without
+added latency, so it measures SDK deserialisation plus our own work.
+
+Usage (development sites only, scratch records are deleted afterwards):
+	bench --site <site> execute wallee_integration.benchmarks.hot_path.run
+	bench --site <site> execute wallee_integration.benchmarks.hot_path.run --kwargs "{'sizes': '1,500', 'save': '/tmp/before.json'}"
+	bench --site <site> execute wallee_integration.benchmarks.hot_path.run --kwargs "{'compare': '/tmp/before.json'}"
+
+With ``compare``, steps slower than the saved run by more than
+REGRESSION_THRESHOLD are flagged, so a change to the sync path can be
+checked before review.
+"""
+
+import json
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+import frappe
+
+
+DEFAULT_SIZES = "1,10,100,500"
+
+# Relative slow-down against a saved run that is reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# SDK attributes holding enums (read through .value by the app)
+ENUM_FIELDS = {
+	"state", "type", "authorization_environment", "user_interface_type", "customers_presence"
+}
+
+
+def run(sizes=DEFAULT_SIZES, completions=20, repeat=20, save=None, compare=None):
+	"""Time the update path for each size and print the results."""
+	from wallee_integration.benchmarks.fake_wallee import FakeWallee
+	from wallee_integration.benchmarks.load import _delete_records, _reset_circuit, _set_api_host
+
+	sizes = [int(size) for size in str(sizes).split(",")]
+	repeat = int(repeat)
+	results = {}
+
+	fake = FakeWallee(terminal_delay=0).start()
+	api_host = frappe.db.get_single_value("Wallee Settings", "api_host")
+
+	try:
+		_set_api_host(fake.url)
+		_reset_circuit()
+
+		for size in sizes:
+			results[size] = _run_size(fake, size, int(completions), repeat)
+	finally:
+		fake.stop()
+		_set_api_host(api_host)
+		_delete_records()
+
+	baseline = _load(compare) if compare else None
+	_print_results(results, baseline, int(completions), repeat)
+
+	if save:
+		with open(save, "w") as f:
+			json.dump({str(size): steps for size, steps in results.items()}, f, indent=1)
+
+	return results
+
+
+def _run_size(fake, size, completions, repeat):
+	from wallee_integration.api import handle_transaction_webhook
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		_update_card_details,
+		_update_completion_details,
+		_update_line_items,
+		update_transaction_from_wallee
+	)
+
+	data = _make_transaction_data(fake, size, completions)
+	tx = to_sdk_like(data)
+	doc = _create_record(data)
+
+	# Bring the record up to date once, so the timed updates find no status change
+	update_transaction_from_wallee(doc, tx)
+
+	def update_unchanged_items():
+		tx.version += 1
+		update_transaction_from_wallee(doc, tx)
+
+	def update_changed_items():
+		tx.version += 1
+		tx.line_items[0].amount_including_tax += 1
+		update_transaction_from_wallee(doc, tx)
+
+	def webhook():
+		fake.touch([data["id"]])
+		handle_transaction_webhook(data["id"], fake.webhook_payload(data["id"]))
+
+	steps = {
+		"card details": lambda: _update_card_details(doc, tx),
+		"completion details": lambda: _update_completion_details(doc, tx),
+		"line items": lambda: _update_line_items(doc, tx),
+		"update, items unchanged": update_unchanged_items,
+		"update, items changed": update_changed_items,
+		"webhook via fake Wallee": webhook,
+	}
+
+	results = {}
+	for name, fn in steps.items():
+		# Reset the in-memory changes of the pure steps before the DB steps run
+		doc.reload()
+		results[name] = measure(fn, repeat)
+
+	return results
+
+
+def measure(fn, repeat=20):
+	"""
+	Time fn and record its allocations.
+
+	Returns:
+		dict: min/median/mean in ms over ``repeat`` calls after one warm-up
+			call, and the peak KiB allocated by one call traced separately
+	"""
+	fn()
+
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		timings.append((time.perf_counter() - start) * 1000)
+
+	tracemalloc.start()
+	try:
+		fn()
+		peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+	return {
+		"min_ms": round(min(timings), 3),
+		"median_ms": round(statistics.median(timings), 3),
+		"mean_ms": round(statistics.fmean(timings), 3),
+		"peak_kib": round(peak / 1024, 1),
+	}
+
+
+def to_sdk_like(value, key=None):
+	"""
+	Convert Wallee JSON into attribute objects shaped like SDK models:
+	snake_case attributes, enums with ``.value`` and datetimes for ``*_on``.
+	"""
+	if isinstance(value, dict):
+		return SimpleNamespace(**{
+			_snake_case(name): to_sdk_like(item, _snake_case(name))
+			for name, item in value.items()
+		})
+
+	if isinstance(value, list):
+		return [to_sdk_like(item) for item in value]
+
+	if key in ENUM_FIELDS and isinstance(value, str):
+		return SimpleNamespace(value=value)
+
+	if key and key.endswith("_on") and isinstance(value, str):
+		return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+	return value
+
+
+def _make_transaction_data(fake, size, completions):
+	"""Create a fulfilled transaction with ``size`` line items and ``completions`` completions on the fake server."""
+	from wallee_integration.benchmarks.load import _new_reference
+
+	reference = _new_reference()
+	data = fake.create_transaction({
+		"currency": "CHF",
+		"merchantReference": reference,
+		"lineItems": [
+			{
+				"name": f"Item {i}",
+				"uniqueId": f"{reference}-{i}",
+				"sku": f"SKU-{i:04d}",
+				"quantity": 1 + i % 3,
+				"amountIncludingTax": 10.0 + i,
+				"type": "PRODUCT",
+			}
+			for i in range(size)
+		],
+	})
+	fake.set_state(data["id"], "FULFILL")
+
+	# set_state adds the successful completion, failed ones after it are
+	# scanned first when looking for the last successful one
+	successful = data["completions"][0]
+	for i in range(completions - 1):
+		data["completions"].append(dict(successful, id=fake.next_id(), state="FAILED"))
+
+	return data
+
+
+def _create_record(data):
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		create_transaction_record
+	)
+
+	return create_transaction_record(
+		transaction_id=data["id"],
+		amount=data["authorizationAmount"],
+		currency=data["currency"],
+		transaction_type="Online",
+		merchant_reference=data["merchantReference"],
+		status="Fulfill"
+	)
+
+
+def _snake_case(name):
+	return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def _load(path):
+	with open(path) as f:
+		return json.load(f)
+
+
+def _print_results(results, baseline, completions, repeat):
+	print(f"Transaction update path ({completions} completions, {repeat} calls per step, ms per call)")
+	print(f"{'items':>6}  {'step':<26}{'min':>10}{'median':>10}{'mean':>10}{'peak KiB':>10}{'vs saved':>10}")
+
+	for size, steps in results.items():
+		for name, timing in steps.items():
+			change = ""
+			saved = (baseline or {}).get(str(size), {}).get(name)
+			if saved and saved["median_ms"]:
+				ratio = timing["median_ms"] / saved["median_ms"] - 1
+				change = f"{ratio:+.0%}" + (" !" if ratio > REGRESSION_THRESHOLD else "")
+
+			print(
+				f"{size:>6}  {name:<26}{timing['min_ms']:>10.3f}{timing['median_ms']:>10.3f}"
+				f"{timing['mean_ms']:>10.3f}{timing['peak_kib']:>10.1f}{change:>10}"
+			)
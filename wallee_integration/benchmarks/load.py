@@ -0,0 +1,409 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+End-to-end load benchmark against the fake Wallee API (see fake_wallee).
+
+Starts the fake server in-process, points Wallee Settings at it for the
+duration of the run and drives the app's own code paths from concurrent
+threads, each with its own site connection:
+
+- checkout: create the Wallee transaction and its local record, as the
+  webshop does before redirecting to the payment page
+- terminal: create a POS transaction, run the terminal payment and handle
+  the resulting webhook until the POS sees the payment authorized
+- webhooks: a burst of transaction webhooks, delivered over HTTP to the
+  running site when ``site_url`` is given, otherwise dispatched in-process
+- sync: scheduled sync runs over ``sync_transactions`` open transactions
+
+Reports p50/p95/p99 latency and operations per second per scenario, plus the
+requests the fake server received.
+
+Usage (development sites only - Wallee Settings are changed while it runs
+and benchmark transactions are created):
+	bench --site <site> execute wallee_integration.benchmarks.load.run
+	bench --site <site> execute wallee_integration.benchmarks.load.run --kwargs "{'scenarios': 'terminal', 'latency': 0.2, 'error_rate': 0.05}"
+
+Wallee must be enabled with credentials set (any values, the fake server does
+not check them). API Host is restored and the benchmark transactions are
+deleted afterwards unless ``keep_records`` is set.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+
+
+SCENARIOS = ("checkout", "terminal", "webhooks", "sync")
+
+# Merchant reference prefix of the records created by the benchmark
+REFERENCE_PREFIX = "wallee-bench-"
+
+WEBHOOK_PATH = "/api/method/wallee_integration.api.webhook"
+
+# Longest wait for queued webhooks to be processed after a burst
+WEBHOOK_DRAIN_TIMEOUT = 300
+
+
+def run(scenarios=",".join(SCENARIOS), iterations=50, concurrency=4, latency=0.05, jitter=0.02,
+		error_rate=0.0, error_status=503, terminal_delay=1.0, webhook_burst=200, sync_transactions=500,
+		sync_runs=3, site_url=None, keep_records=False):
+	"""Run the scenarios against a fake Wallee API and print the latency report."""
+	from wallee_integration.benchmarks.fake_wallee import FakeWallee
+
+	scenarios = [s.strip() for s in scenarios.split(",")] if isinstance(scenarios, str) else list(scenarios)
+	unknown = set(scenarios) - set(SCENARIOS)
+	if unknown:
+		frappe.throw("Unknown scenarios: {0}".format(", ".join(sorted(unknown))))
+
+	settings = frappe.get_single("Wallee Settings")
+	if not (settings.enabled and settings.user_id and settings.space_id):
+		frappe.throw("Enable Wallee and set credentials (any values) before running the benchmark")
+
+	fake = FakeWallee(
+		latency=float(latency), jitter=float(jitter), error_rate=float(error_rate),
+		error_status=int(error_status), terminal_delay=float(terminal_delay)
+	).start()
+	api_host = settings.api_host
+	results = {}
+	started = time.perf_counter()
+
+	try:
+		_set_api_host(fake.url)
+
+		for scenario in scenarios:
+			_reset_circuit()
+			if scenario == "checkout":
+				results[scenario] = _run_concurrently(_checkout, fake, int(iterations), int(concurrency))
+			elif scenario == "terminal":
+				results[scenario] = _run_concurrently(_terminal_payment, fake, int(iterations), int(concurrency))
+			elif scenario == "webhooks":
+				results[scenario] = _webhook_burst(fake, int(webhook_burst), int(concurrency), site_url)
+			elif scenario == "sync":
+				results[scenario] = _sync(fake, int(sync_transactions), int(sync_runs))
+	finally:
+		fake.stop()
+		_set_api_host(api_host)
+		if not keep_records:
+			_delete_records()
+
+	elapsed = time.perf_counter() - started
+	report = {name: _summarize(result) for name, result in results.items()}
+	requests = sum(fake.stats.values())
+	report["wallee"] = {
+		"requests": requests,
+		"per_second": round(requests / elapsed, 2) if elapsed else 0,
+		"by_route": dict(fake.stats),
+	}
+
+	_print_report(report, fake)
+	return report
+
+
+# Scenarios: each operation runs in a thread with its own site connection
+
+def _checkout(fake):
+	from wallee_integration.wallee_integration.api.transaction import create_transaction
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		create_transaction_record
+	)
+
+	reference = _new_reference()
+	line_items = [
+		{"name": f"Item {i}", "quantity": 1, "amount": 10.0 + i, "unique_id": f"{reference}-{i}"}
+		for i in range(3)
+	]
+
+	tx = create_transaction(
+		line_items=line_items,
+		currency="CHF",
+		merchant_reference=reference,
+		success_url=f"{frappe.utils.get_url()}/wallee/success",
+		failed_url=f"{frappe.utils.get_url()}/wallee/failed"
+	)
+	create_transaction_record(
+		transaction_id=tx["transaction_id"],
+		amount=sum(item["amount"] for item in line_items),
+		currency="CHF",
+		transaction_type="Online",
+		merchant_reference=reference
+	)
+
+
+def _terminal_payment(fake):
+	from wallee_integration.api import handle_transaction_webhook
+	from wallee_integration.wallee_integration.api.pos import get_terminal_payment_status, process_terminal_async
+	from wallee_integration.wallee_integration.api.transaction import create_transaction
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		create_transaction_record
+	)
+
+	reference = _new_reference()
+	terminal_id = next(iter(fake.terminals))
+
+	tx = create_transaction(
+		line_items=[{"name": "POS Payment", "quantity": 1, "amount": 25.0}],
+		currency="CHF",
+		merchant_reference=reference,
+		auto_confirm=False
+	)
+	doc = create_transaction_record(
+		transaction_id=tx["transaction_id"],
+		amount=25.0,
+		currency="CHF",
+		transaction_type="Terminal",
+		merchant_reference=reference
+	)
+
+	# What initiate_terminal_payment enqueues, run inline to time it
+	process_terminal_async(terminal_id, tx["transaction_id"], doc.name)
+	handle_transaction_webhook(tx["transaction_id"], fake.webhook_payload(tx["transaction_id"]))
+
+	status = get_terminal_payment_status(doc.name)
+	if not status.get("completed"):
+		raise Exception("Terminal payment not authorized: {0}".format(status.get("status")))
+
+
+def _webhook_burst(fake, count, concurrency, site_url=None):
+	transaction_ids = _create_open_transactions(fake, count)
+	for transaction_id in transaction_ids:
+		fake.set_state(transaction_id, "FULFILL")
+
+	payloads = [fake.webhook_payload(transaction_id) for transaction_id in transaction_ids]
+
+	if not site_url:
+		from wallee_integration.api import _dispatch_webhook
+
+		result = _run_concurrently(lambda fake, payload: _dispatch_webhook(payload), fake, payloads, concurrency)
+		result["note"] = "in-process dispatch"
+		return result
+
+	settings = frappe.get_single("Wallee Settings")
+	secret = settings.get_password("webhook_secret", raise_exception=False) if settings.webhook_secret else None
+
+	started = time.perf_counter()
+	deliveries = fake.send_webhooks(site_url.rstrip("/") + WEBHOOK_PATH, payloads, concurrency, secret)
+	result = {
+		"durations": [seconds for seconds, status in deliveries],
+		"errors": [status for seconds, status in deliveries if status != 200],
+		"elapsed": time.perf_counter() - started,
+		"note": "HTTP",
+	}
+
+	if settings.webhook_processing == "Queued":
+		result["drained_after"] = _wait_for_webhook_queue(started)
+
+	return result
+
+
+def _sync(fake, count, runs):
+	from wallee_integration.tasks import sync_pending_transactions
+
+	transaction_ids = _create_open_transactions(fake, count)
+	durations = []
+	errors = []
+	started = time.perf_counter()
+
+	for run_index in range(runs):
+		# A share of the transactions changes on Wallee between two runs
+		changed = transaction_ids[run_index::4]
+		fake.touch(changed)
+		for transaction_id in changed[::2]:
+			fake.set_state(transaction_id, "AUTHORIZED")
+
+		run_started = time.perf_counter()
+		stats = sync_pending_transactions() or {}
+		durations.append(time.perf_counter() - run_started)
+		errors.extend(["failed"] * (stats.get("failed") or 0))
+
+	return {
+		"durations": durations,
+		"errors": errors,
+		"elapsed": time.perf_counter() - started,
+		"note": f"{count} open transactions per run",
+	}
+
+
+# Helpers
+
+def _run_concurrently(operation, fake, iterations, concurrency):
+	"""
+	Run operation(fake[, item]) from worker threads, each with its own site connection.
+
+	Args:
+		iterations: Number of operations, or a list of items passed to each call
+	"""
+	site = frappe.local.site
+	sites_path = frappe.local.sites_path
+	items = iterations if isinstance(iterations, list) else [None] * iterations
+	durations = []
+	errors = []
+	lock = threading.Lock()
+
+	def worker(chunk):
+		frappe.init(site=site, sites_path=sites_path)
+		frappe.connect()
+		frappe.set_user("Administrator")
+
+		try:
+			for item in chunk:
+				start = time.perf_counter()
+				try:
+					if item is None:
+						operation(fake)
+					else:
+						operation(fake, item)
+					frappe.db.commit()
+					error = None
+				except Exception as e:
+					frappe.db.rollback()
+					error = e
+
+				with lock:
+					durations.append(time.perf_counter() - start)
+					if error:
+						errors.append(error)
+		finally:
+			frappe.destroy()
+
+	concurrency = max(1, min(concurrency, len(items)))
+	chunks = [items[i::concurrency] for i in range(concurrency)]
+
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		list(executor.map(worker, chunks))
+
+	return {"durations": durations, "errors": errors, "elapsed": time.perf_counter() - started}
+
+
+def _create_open_transactions(fake, count):
+	"""Create transactions on the fake server and their local Pending records, without timing them."""
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		create_transaction_record
+	)
+
+	transaction_ids = []
+	for i in range(count):
+		reference = _new_reference()
+		tx = fake.create_transaction({
+			"currency": "CHF",
+			"merchantReference": reference,
+			"autoConfirmationEnabled": True,
+			"lineItems": [{"name": "Item", "quantity": 1, "amountIncludingTax": 10.0, "uniqueId": reference}],
+		})
+		create_transaction_record(
+			transaction_id=tx["id"],
+			amount=10.0,
+			currency="CHF",
+			transaction_type="Online",
+			merchant_reference=reference
+		)
+		transaction_ids.append(tx["id"])
+
+	return transaction_ids
+
+
+def _wait_for_webhook_queue(started):
+	"""Seconds from the start of the burst until no queued webhook is left, None on timeout."""
+	while time.perf_counter() - started < WEBHOOK_DRAIN_TIMEOUT:
+		frappe.db.rollback()
+		if not frappe.db.count("Wallee Webhook Log", {"processing_status": "Queued"}):
+			return round(time.perf_counter() - started, 3)
+		time.sleep(0.5)
+
+	return None
+
+
+def _new_reference():
+	return REFERENCE_PREFIX + frappe.generate_hash(length=12)
+
+
+def _set_api_host(api_host):
+	from wallee_integration.wallee_integration.api.client import clear_settings_cache
+
+	frappe.db.set_single_value("Wallee Settings", "api_host", api_host)
+	frappe.db.commit()
+	clear_settings_cache()
+
+
+def _reset_circuit():
+	"""Close the circuit breaker left open by a previous scenario's injected errors."""
+	cache = frappe.cache()
+	cache.delete(cache.make_key("wallee_circuit_open"), cache.make_key("wallee_circuit_failures"))
+
+
+def _delete_records():
+	names = frappe.get_all(
+		"Wallee Transaction",
+		filters={"merchant_reference": ["like", f"{REFERENCE_PREFIX}%"]},
+		pluck="name"
+	)
+
+	for offset in range(0, len(names), 500):
+		batch = names[offset:offset + 500]
+		frappe.db.delete("Wallee Transaction Item", {"parent": ["in", batch]})
+		frappe.db.delete("Wallee Transaction", {"name": ["in", batch]})
+
+	frappe.db.commit()
+
+
+def _summarize(result):
+	durations = sorted(result["durations"])
+	elapsed = result.get("elapsed") or 0
+
+	summary = {
+		"operations": len(durations),
+		"errors": len(result["errors"]),
+		"p50_ms": _percentile(durations, 50),
+		"p95_ms": _percentile(durations, 95),
+		"p99_ms": _percentile(durations, 99),
+		"per_second": round(len(durations) / elapsed, 2) if elapsed else 0,
+		"note": result.get("note"),
+	}
+
+	if result.get("errors"):
+		summary["first_error"] = str(result["errors"][0])
+	if "drained_after" in result:
+		summary["drained_after"] = result["drained_after"]
+
+	return summary
+
+
+def _percentile(sorted_values, percent):
+	if not sorted_values:
+		return None
+
+	index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+	return round(sorted_values[index] * 1000, 1)
+
+
+def _print_report(report, fake):
+	print(
+		f"Fake Wallee: latency {fake.latency * 1000:.0f} ms (+{fake.jitter * 1000:.0f} ms jitter), "
+		f"error rate {fake.error_rate:.0%} ({fake.error_status}), terminal {fake.terminal_delay:.1f} s"
+	)
+	print(f"{'scenario':<12}{'ops':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}  note")
+
+	for name, summary in report.items():
+		if name == "wallee":
+			continue
+		print(
+			f"{name:<12}{summary['operations']:>8}{summary['errors']:>8}"
+			f"{_format_ms(summary['p50_ms'])}{_format_ms(summary['p95_ms'])}{_format_ms(summary['p99_ms'])}"
+			f"{summary['per_second']:>10}  {summary['note'] or ''}"
+		)
+		if summary.get("drained_after") is not None:
+			print(f"{'':<12}queued webhooks processed after {summary['drained_after']} s")
+		if summary.get("first_error"):
+			print(f"{'':<12}first error: {summary['first_error'][:200]}")
+
+	wallee = report["wallee"]
+	print(f"Wallee requests: {wallee['requests']} ({wallee['per_second']}/s)")
+	for route, count in sorted(wallee["by_route"].items(), key=lambda item: -item[1]):
+		print(f"  {route:<40}{count:>8}")
+
+
+def _format_ms(value):
+	return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
@@ -0,0 +1,120 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+Benchmark Wallee Transaction lookups with and without the hot-path indexes.
+
+Builds a scratch table shaped like ``tabWallee Transaction`` (only the
+filtered columns), fills it with synthetic rows and times the lookups done
+by webhooks, the success page and the scheduled sync, first without any
+secondary index and then with the indexes declared on the doctype.
+
+Usage:
+	bench --site <site> execute wallee_integration.benchmarks.transaction_lookup.run
+	bench --site <site> execute wallee_integration.benchmarks.transaction_lookup.run --kwargs "{'rows': 100000}"
+
+The scratch table is dropped afterwards; nothing else is touched.
+"""
+
+import random
+import time
+
+import frappe
+
+
+TABLE = "_wallee_bench_transaction"
+
+STATUSES = [
+	"Pending", "Processing", "Authorized", "Completed", "Fulfill",
+	"Failed", "Voided", "Refunded"
+]
+
+INSERT_BATCH_SIZE = 10000
+
+
+def run(rows=1000000, lookups=50):
+	"""Build the scratch table, run the lookups before and after indexing and print the timings."""
+	rows = int(rows)
+	lookups = int(lookups)
+
+	try:
+		_create_table(rows)
+
+		before = _time_lookups(rows, lookups)
+		_add_indexes()
+		after = _time_lookups(rows, lookups)
+	finally:
+		frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{TABLE}`")
+
+	print(f"Wallee Transaction lookups over {rows} rows ({lookups} lookups each, ms per lookup)")
+	print(f"{'lookup':<36}{'no index':>12}{'indexed':>12}{'speed-up':>12}")
+	for name in before:
+		speedup = before[name] / after[name] if after[name] else float("inf")
+		print(f"{name:<36}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>11.1f}x")
+
+	return {"before": before, "after": after}
+
+
+def _create_table(rows):
+	frappe.db.sql_ddl(f"DROP TABLE IF EXISTS `{TABLE}`")
+	frappe.db.sql_ddl(f"""
+		CREATE TABLE `{TABLE}` (
+			name VARCHAR(140) NOT NULL PRIMARY KEY,
+			transaction_id VARCHAR(140),
+			status VARCHAR(140),
+			payment_request VARCHAR(140),
+			modified DATETIME(6)
+		)
+	""")
+
+	start = time.time() - rows
+	for offset in range(0, rows, INSERT_BATCH_SIZE):
+		values = []
+		for i in range(offset, min(offset + INSERT_BATCH_SIZE, rows)):
+			values.append((
+				f"WTX-{i:08d}",
+				str(100000000 + i),
+				random.choice(STATUSES),
+				f"ACC-PRQ-{i:08d}",
+				frappe.utils.get_datetime(start + i),
+			))
+
+		placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(values))
+		frappe.db.sql(
+			f"INSERT INTO `{TABLE}` (name, transaction_id, status, payment_request, modified) VALUES {placeholders}",
+			[value for row in values for value in row]
+		)
+
+	frappe.db.commit()
+
+
+def _add_indexes():
+	frappe.db.sql_ddl(f"ALTER TABLE `{TABLE}` ADD UNIQUE INDEX transaction_id (transaction_id)")
+	frappe.db.sql_ddl(f"ALTER TABLE `{TABLE}` ADD INDEX payment_request (payment_request)")
+	frappe.db.sql_ddl(f"ALTER TABLE `{TABLE}` ADD INDEX status_modified_index (status, modified)")
+
+
+def _time_lookups(rows, lookups):
+	queries = {
+		"transaction_id (webhook, refund)": (
+			f"SELECT name FROM `{TABLE}` WHERE transaction_id = %s",
+			lambda: str(100000000 + random.randrange(rows)),
+		),
+		"payment_request (success page)": (
+			f"SELECT name FROM `{TABLE}` WHERE payment_request = %s",
+			lambda: f"ACC-PRQ-{random.randrange(rows):08d}",
+		),
+		"status + modified (sync)": (
+			f"SELECT name FROM `{TABLE}` WHERE status = %s ORDER BY modified DESC LIMIT 100",
+			lambda: random.choice(["Pending", "Processing", "Authorized"]),
+		),
+	}
+
+	timings = {}
+	for name, (query, make_value) in queries.items():
+		start = time.perf_counter()
+		for _ in range(lookups):
+			frappe.db.sql(query, make_value())
+		timings[name] = (time.perf_counter() - start) * 1000 / lookups
+
+	return timings
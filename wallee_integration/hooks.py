@@ -167,6 +167,10 @@ fixtures = [
 # ---------------
 
 scheduler_events = {
+	"all": [
+		"wallee_integration.api.drain_webhook_queue",
+		"wallee_integration.wallee_integration.api.api_log.persist_api_logs"
+	],
 	"cron": {
 		"*/5 * * * *": [
 			"wallee_integration.tasks.sync_pending_transactions"
@@ -214,13 +218,23 @@ website_route_rules = [
 	{"from_route": "/wallee/failed", "to_route": "wallee_failed"},
 ]
 
-# before_request = ["wallee_integration.utils.before_request"]
-# after_request = ["wallee_integration.utils.after_request"]
+before_request = ["wallee_integration.wallee_integration.api.profiling.start_request_profiling"]
+after_request = [
+	"wallee_integration.wallee_integration.api.profiling.stop_profiling",
+	"wallee_integration.wallee_integration.api.api_log.flush_api_log_buffer",
+	"wallee_integration.wallee_integration.api.metrics.flush_metrics",
+	"wallee_integration.wallee_integration.api.tracing.flush_spans"
+]
 
 # Job Events
 # ----------
-# before_job = ["wallee_integration.utils.before_job"]
-# after_job = ["wallee_integration.utils.after_job"]
+before_job = ["wallee_integration.wallee_integration.api.profiling.start_job_profiling"]
+after_job = [
+	"wallee_integration.wallee_integration.api.profiling.stop_profiling",
+	"wallee_integration.wallee_integration.api.api_log.flush_api_log_buffer",
+	"wallee_integration.wallee_integration.api.metrics.flush_metrics",
+	"wallee_integration.wallee_integration.api.tracing.flush_spans"
+]
 
 # User Data Protection
 # --------------------
@@ -247,3 +261,8 @@ export_python_type_annotations = True
 # default_log_clearing_doctypes = {
 # 	"Logging DocType Name": 30  # days to retain logs
 # }
+
+default_log_clearing_doctypes = {
+	"Wallee API Log": 30,
+	"Wallee Profile Record": 30
+}
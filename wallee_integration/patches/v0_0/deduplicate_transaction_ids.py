@@ -0,0 +1,54 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+import frappe
+
+
+def execute():
+	"""
+	Prepare Wallee Transaction for the unique index on transaction_id.
+
+	Empty IDs are stored as NULL. Records sharing a Wallee ID are not changed:
+	they are listed in the Error Log and the migration stops, so they can be
+	merged or corrected by hand before running it again.
+	"""
+	if not frappe.db.table_exists("Wallee Transaction"):
+		return
+
+	frappe.db.sql("""
+		UPDATE `tabWallee Transaction`
+		SET transaction_id = NULL
+		WHERE transaction_id = ''
+	""")
+
+	duplicates = frappe.db.sql("""
+		SELECT transaction_id
+		FROM `tabWallee Transaction`
+		WHERE transaction_id IS NOT NULL
+		GROUP BY transaction_id
+		HAVING COUNT(*) > 1
+	""", pluck=True)
+
+	if not duplicates:
+		return
+
+	lines = []
+	for transaction_id in duplicates:
+		names = frappe.get_all(
+			"Wallee Transaction",
+			filters={"transaction_id": transaction_id},
+			order_by="modified desc",
+			pluck="name"
+		)
+		lines.append("{0}: {1}".format(transaction_id, ", ".join(names)))
+
+	message = (
+		"Several Wallee Transactions share a Wallee transaction ID, which must be unique. "
+		"Merge or correct these records, then run the migration again:\n" + "\n".join(lines)
+	)
+
+	frappe.log_error(title="Wallee Transaction: duplicate transaction IDs", message=message)
+	# Keep the log when the migration is rolled back
+	frappe.db.commit()
+
+	frappe.throw(message, title="Duplicate Wallee Transaction IDs")
@@ -6,8 +6,9 @@ frappe.provide("wallee_integration");
 wallee_integration.WalleeTerminal = class WalleeTerminal {
 	constructor(options = {}) {
 		this.terminal = options.terminal || null;
-		this.polling_interval = options.polling_interval || 2000;
-		this.max_polling_attempts = options.max_polling_attempts || 60;
+		// Status changes are pushed over realtime, polling is only a fallback
+		this.polling_interval = options.polling_interval || 10000;
+		this.max_polling_attempts = options.max_polling_attempts || 18;
 		this.on_success = options.on_success || (() => {});
 		this.on_failure = options.on_failure || (() => {});
 		this.on_status_change = options.on_status_change || (() => {});
@@ -15,6 +16,11 @@ wallee_integration.WalleeTerminal = class WalleeTerminal {
 		this.current_transaction = null;
 		this.polling_timer = null;
 		this.polling_attempts = 0;
+		this.status_handler = (data) => {
+			if (data && data.transaction_name === this.current_transaction) {
+				this.handle_status(data);
+			}
+		};
 	}
 
 	async initiate_payment(amount, currency, pos_invoice = null, customer = null) {
@@ -36,6 +42,7 @@ wallee_integration.WalleeTerminal = class WalleeTerminal {
 			if (response.message && response.message.success) {
 				this.current_transaction = response.message.transaction_name;
 				this.on_status_change("processing", response.message);
+				this.subscribe();
 				this.start_polling();
 				return response.message;
 			} else {
@@ -47,6 +54,18 @@ wallee_integration.WalleeTerminal = class WalleeTerminal {
 		}
 	}
 
+	subscribe() {
+		frappe.realtime.doc_subscribe("Wallee Transaction", this.current_transaction);
+		frappe.realtime.on("wallee_transaction_status", this.status_handler);
+	}
+
+	unsubscribe() {
+		frappe.realtime.off("wallee_transaction_status", this.status_handler);
+		if (this.current_transaction) {
+			frappe.realtime.doc_unsubscribe("Wallee Transaction", this.current_transaction);
+		}
+	}
+
 	start_polling() {
 		if (this.polling_timer) {
 			clearInterval(this.polling_timer);
@@ -62,6 +81,7 @@ wallee_integration.WalleeTerminal = class WalleeTerminal {
 			clearInterval(this.polling_timer);
 			this.polling_timer = null;
 		}
+		this.unsubscribe();
 	}
 
 	async check_status() {
@@ -80,28 +100,35 @@ wallee_integration.WalleeTerminal = class WalleeTerminal {
 
 		try {
 			const response = await frappe.call({
-				method: "wallee_integration.wallee_integration.api.pos.check_terminal_payment_status",
+				method: "wallee_integration.wallee_integration.api.pos.get_terminal_payment_status",
 				args: {
 					transaction_name: this.current_transaction
 				}
 			});
 
-			const result = response.message;
-
-			if (result.completed) {
-				this.stop_polling();
-				this.on_success(result);
-			} else if (result.failed) {
-				this.stop_polling();
-				this.on_failure(new Error(result.failure_reason || __("Payment failed")));
-			} else {
-				this.on_status_change(result.status, result);
-			}
+			this.handle_status(response.message);
 		} catch (error) {
 			console.error("Error checking payment status:", error);
 		}
 	}
 
+	handle_status(result) {
+		if (!this.polling_timer) {
+			// Already finished through the other channel
+			return;
+		}
+
+		if (result.completed) {
+			this.stop_polling();
+			this.on_success(result);
+		} else if (result.failed) {
+			this.stop_polling();
+			this.on_failure(new Error(result.failure_reason || __("Payment failed")));
+		} else {
+			this.on_status_change(result.status, result);
+		}
+	}
+
 	async cancel_payment() {
 		if (!this.current_transaction) {
 			return { success: false, message: __("No active transaction") };
@@ -748,18 +748,29 @@ wallee_integration.process_terminal_payment = async function(dialog, terminal, a
 
 /**
  * Poll for payment status
+ *
+ * Status changes are pushed over realtime as soon as the webhook or sync job
+ * records them; polling only remains as a slow fallback.
  */
 wallee_integration.poll_payment_status = async function(dialog, transactionName, config, attempts = 0) {
-    const maxAttempts = 90;  // 3 minutes with 2-second intervals
-    const pollInterval = 2000;
+    const maxAttempts = 18;  // 3 minutes with 10-second intervals
+    const pollInterval = 10000;
     const statusDiv = dialog.$wrapper.find('.wallee-payment-status');
 
-    // Check if polling was cancelled
+    if (attempts === 0) {
+        wallee_integration.subscribe_payment_status(dialog, transactionName, config);
+    }
+
+    // Check if polling was cancelled or the payment finished
     if (!dialog.wallee_polling_active) {
+        wallee_integration.unsubscribe_payment_status(dialog, transactionName);
         return;
     }
 
     if (attempts >= maxAttempts) {
+        dialog.wallee_polling_active = false;
+        wallee_integration.unsubscribe_payment_status(dialog, transactionName);
+
         statusDiv.html(`
             <div class="alert alert-warning">
                 <i class="fa fa-clock-o"></i>
@@ -774,7 +785,7 @@ wallee_integration.poll_payment_status = async function(dialog, transactionName,
 
     try {
         const result = await frappe.call({
-            method: 'wallee_integration.wallee_integration.api.pos.check_terminal_payment_status',
+            method: 'wallee_integration.wallee_integration.api.pos.get_terminal_payment_status',
             args: { transaction_name: transactionName },
             freeze: false,
             error: function() {
@@ -782,194 +793,240 @@ wallee_integration.poll_payment_status = async function(dialog, transactionName,
             }
         });
 
-        if (result.message) {
-            const status = result.message.status;
-            const wallee_state = result.message.wallee_state;
+        if (result.message && wallee_integration.show_payment_status(dialog, transactionName, config, result.message)) {
+            setTimeout(() => {
+                wallee_integration.poll_payment_status(dialog, transactionName, config, attempts + 1);
+            }, pollInterval);
+        }
+    } catch (error) {
+        console.error('Status check error:', error);
+        // Continue polling on error
+        setTimeout(() => {
+            wallee_integration.poll_payment_status(dialog, transactionName, config, attempts + 1);
+        }, pollInterval);
+    }
+};
 
-            if (status === 'Completed' || status === 'Authorized' || status === 'Fulfill') {
-                // Success! Cleanup WebSocket connection
-                if (dialog.wallee_till_connection) {
-                    dialog.wallee_till_connection = null;
+/**
+ * Listen for status changes pushed for the transaction
+ */
+wallee_integration.subscribe_payment_status = function(dialog, transactionName, config) {
+    dialog.wallee_status_handler = function(data) {
+        if (data && data.transaction_name === transactionName) {
+            wallee_integration.show_payment_status(dialog, transactionName, config, data);
+        }
+    };
+
+    frappe.realtime.doc_subscribe('Wallee Transaction', transactionName);
+    frappe.realtime.on('wallee_transaction_status', dialog.wallee_status_handler);
+};
+
+wallee_integration.unsubscribe_payment_status = function(dialog, transactionName) {
+    if (!dialog.wallee_status_handler) {
+        return;
+    }
+
+    frappe.realtime.off('wallee_transaction_status', dialog.wallee_status_handler);
+    frappe.realtime.doc_unsubscribe('Wallee Transaction', transactionName);
+    dialog.wallee_status_handler = null;
+};
+
+/**
+ * Show a payment status received from polling or realtime
+ *
+ * Returns true while the payment is still processing.
+ */
+wallee_integration.show_payment_status = function(dialog, transactionName, config, data) {
+    const statusDiv = dialog.$wrapper.find('.wallee-payment-status');
+
+    // Ignore updates once the payment was finished or cancelled
+    if (!dialog.wallee_polling_active) {
+        return false;
+    }
+
+    const status = data.status;
+    const wallee_state = data.wallee_state;
+
+    if (status === 'Completed' || status === 'Authorized' || status === 'Fulfill') {
+        dialog.wallee_polling_active = false;
+        // Success! Cleanup WebSocket connection
+        if (dialog.wallee_till_connection) {
+            dialog.wallee_till_connection = null;
+        }
+
+        statusDiv.html(`
+            <div class="alert alert-success">
+                <i class="fa fa-check-circle"></i>
+                <strong>${__('Payment Successful!')}</strong><br>
+                ${__('Amount')}: ${config.currency} ${data.amount}<br>
+                ${__('Transaction')}: ${transactionName}
+            </div>
+        `);
+        dialog.set_primary_action(__('Close'), () => dialog.hide());
+
+        // Save to localStorage if configured
+        if (config.auto_save_to_storage && config.invoice_reference && wallee_integration.captured_payments) {
+            wallee_integration.captured_payments.save(config.invoice_reference, {
+                transaction_name: transactionName,
+                amount: data.amount,
+                currency: config.currency,
+                status: 'Completed',
+                terminal: config._terminal,
+                pos_profile: config.pos_profile,
+                mode_of_payment: config.mode_of_payment
+            });
+        }
+
+        // Call success callback with locked flag for POS integration
+        config.on_success({
+            transaction_name: transactionName,
+            transaction_id: data.transaction_id,
+            amount: data.amount,
+            currency: config.currency,
+            status: status,
+            terminal: config._terminal,
+            mode_of_payment: config.mode_of_payment,
+            is_locked: true,
+            is_wallee_payment: true
+        });
+    } else if (status === 'Voided' || dialog.wallee_canceled_by_websocket || dialog.wallee_canceled_by_user) {
+        dialog.wallee_polling_active = false;
+        // Voided = cancelled by user - cleanup WebSocket connection
+        if (dialog.wallee_till_connection) {
+            dialog.wallee_till_connection = null;
+        }
+
+        // Only show message if not already shown by WebSocket
+        if (!dialog.wallee_canceled_by_websocket) {
+            statusDiv.html(`
+                <div class="alert alert-warning">
+                    <i class="fa fa-ban"></i>
+                    <strong>${__('Payment Cancelled')}</strong><br>
+                    ${__('The payment was cancelled.')}
+                </div>
+            `);
+            dialog.enable_primary_action();
+            config.on_cancel();
+        }
+    } else if (status === 'Failed' || status === 'Decline') {
+        dialog.wallee_polling_active = false;
+        // Check if this is actually a user cancel (user clicked Cancel button, WebSocket cancel, or failure_reason contains cancel)
+        const failureReason = data.failure_reason || '';
+        const isCanceled = dialog.wallee_canceled_by_user ||
+                           dialog.wallee_canceled_by_websocket ||
+                           failureReason.toLowerCase().includes('cancel');
+
+        // Cleanup WebSocket connection
+        if (dialog.wallee_till_connection) {
+            dialog.wallee_till_connection = null;
+        }
+
+        if (isCanceled) {
+            // User cancelled - show cancel message
+            statusDiv.html(`
+                <div class="alert alert-warning">
+                    <i class="fa fa-ban"></i>
+                    <strong>${__('Payment Cancelled')}</strong><br>
+                    ${__('The payment was cancelled.')}
+                </div>
+            `);
+            dialog.enable_primary_action();
+            config.on_cancel();
+        } else {
+            // Real failure
+            const cleanError = failureReason
+                ? wallee_integration.extract_error_message({ message: failureReason })
+                : __('The payment was declined.');
+
+            statusDiv.html(`
+                <div class="alert alert-danger">
+                    <i class="fa fa-times-circle"></i>
+                    <strong>${__('Payment Failed')}</strong><br>
+                    ${cleanError}
+                </div>
+            `);
+            dialog.enable_primary_action();
+            config.on_failure({
+                transaction_name: transactionName,
+                status: status,
+                reason: cleanError
+            });
+        }
+    } else {
+        // Still processing - show status with cancel button
+        statusDiv.html(`
+            <div class="alert alert-warning wallee-status-alert">
+                <div class="wallee-status-content">
+                    <div class="wallee-status-text">
+                        <i class="fa fa-spinner fa-spin"></i>
+                        ${__('Waiting for payment on terminal...')}<br>
+                        <small>${__('Status')}: ${status || wallee_state || 'Processing'}</small>
+                    </div>
+                    <button class="btn btn-sm btn-danger wallee-cancel-payment">
+                        <i class="fa fa-times"></i> ${__('Cancel')}
+                    </button>
+                </div>
+            </div>
+        `);
+
+        // Re-attach cancel button handler with WebSocket support
+        statusDiv.find('.wallee-cancel-payment').on('click', async function() {
+            $(this).prop('disabled', true).html(`<i class="fa fa-spinner fa-spin"></i> ${__('Cancelling...')}`);
+            dialog.wallee_polling_active = false;
+            // Set flag immediately to prevent polling from showing "Payment Failed"
+            dialog.wallee_canceled_by_user = true;
+
+            // Try WebSocket cancel first (real-time terminal cancellation)
+            if (dialog.wallee_till_connection) {
+                try {
+                    dialog.wallee_till_connection.cancel();
+                    await new Promise(resolve => setTimeout(resolve, 1000));
+                } catch (wsError) {
+                    console.warn('WebSocket cancel failed:', wsError);
                 }
+            }
+
+            try {
+                const cancelResult = await frappe.xcall(
+                    'wallee_integration.wallee_integration.api.pos.cancel_terminal_payment',
+                    { transaction_name: transactionName }
+                );
+
+                // Show cancel success message
+                const alertClass = cancelResult.requires_terminal_cancel ? 'alert-warning' : 'alert-success';
+                const icon = cancelResult.requires_terminal_cancel ? 'fa-exclamation-triangle' : 'fa-ban';
+                const message = cancelResult.message || __('Payment cancelled');
 
                 statusDiv.html(`
-                    <div class="alert alert-success">
-                        <i class="fa fa-check-circle"></i>
-                        <strong>${__('Payment Successful!')}</strong><br>
-                        ${__('Amount')}: ${config.currency} ${result.message.amount}<br>
-                        ${__('Transaction')}: ${transactionName}
+                    <div class="alert ${alertClass}">
+                        <i class="fa ${icon}"></i>
+                        ${message}
                     </div>
                 `);
-                dialog.set_primary_action(__('Close'), () => dialog.hide());
-
-                // Save to localStorage if configured
-                if (config.auto_save_to_storage && config.invoice_reference && wallee_integration.captured_payments) {
-                    wallee_integration.captured_payments.save(config.invoice_reference, {
-                        transaction_name: transactionName,
-                        amount: result.message.amount,
-                        currency: config.currency,
-                        status: 'Completed',
-                        terminal: config._terminal,
-                        pos_profile: config.pos_profile,
-                        mode_of_payment: config.mode_of_payment
-                    });
-                }
+                dialog.enable_primary_action();
+                config.on_cancel();
 
-                // Call success callback with locked flag for POS integration
-                config.on_success({
-                    transaction_name: transactionName,
-                    transaction_id: result.message.transaction_id,
-                    amount: result.message.amount,
-                    currency: config.currency,
-                    status: status,
-                    terminal: config._terminal,
-                    mode_of_payment: config.mode_of_payment,
-                    is_locked: true,
-                    is_wallee_payment: true
-                });
-            } else if (status === 'Voided' || dialog.wallee_canceled_by_websocket || dialog.wallee_canceled_by_user) {
-                // Voided = cancelled by user - cleanup WebSocket connection
-                if (dialog.wallee_till_connection) {
-                    dialog.wallee_till_connection = null;
-                }
-
-                // Only show message if not already shown by WebSocket
-                if (!dialog.wallee_canceled_by_websocket) {
-                    statusDiv.html(`
-                        <div class="alert alert-warning">
-                            <i class="fa fa-ban"></i>
-                            <strong>${__('Payment Cancelled')}</strong><br>
-                            ${__('The payment was cancelled.')}
-                        </div>
-                    `);
-                    dialog.enable_primary_action();
-                    config.on_cancel();
-                }
-            } else if (status === 'Failed' || status === 'Decline') {
-                // Check if this is actually a user cancel (user clicked Cancel button, WebSocket cancel, or failure_reason contains cancel)
-                const failureReason = result.message.failure_reason || '';
-                const isCanceled = dialog.wallee_canceled_by_user ||
-                                   dialog.wallee_canceled_by_websocket ||
-                                   failureReason.toLowerCase().includes('cancel');
-
-                // Cleanup WebSocket connection
+                // Cleanup WebSocket
                 if (dialog.wallee_till_connection) {
                     dialog.wallee_till_connection = null;
                 }
-
-                if (isCanceled) {
-                    // User cancelled - show cancel message
-                    statusDiv.html(`
-                        <div class="alert alert-warning">
-                            <i class="fa fa-ban"></i>
-                            <strong>${__('Payment Cancelled')}</strong><br>
-                            ${__('The payment was cancelled.')}
-                        </div>
-                    `);
-                    dialog.enable_primary_action();
-                    config.on_cancel();
-                } else {
-                    // Real failure
-                    const cleanError = failureReason
-                        ? wallee_integration.extract_error_message({ message: failureReason })
-                        : __('The payment was declined.');
-
-                    statusDiv.html(`
-                        <div class="alert alert-danger">
-                            <i class="fa fa-times-circle"></i>
-                            <strong>${__('Payment Failed')}</strong><br>
-                            ${cleanError}
-                        </div>
-                    `);
-                    dialog.enable_primary_action();
-                    config.on_failure({
-                        transaction_name: transactionName,
-                        status: status,
-                        reason: cleanError
-                    });
-                }
-            } else {
-                // Still processing - show status with cancel button
+            } catch (cancelError) {
+                const errorMsg = wallee_integration.extract_error_message(cancelError);
                 statusDiv.html(`
-                    <div class="alert alert-warning wallee-status-alert">
-                        <div class="wallee-status-content">
-                            <div class="wallee-status-text">
-                                <i class="fa fa-spinner fa-spin"></i>
-                                ${__('Waiting for payment on terminal...')}<br>
-                                <small>${__('Status')}: ${status || wallee_state || 'Processing'}</small>
-                            </div>
-                            <button class="btn btn-sm btn-danger wallee-cancel-payment">
-                                <i class="fa fa-times"></i> ${__('Cancel')}
-                            </button>
-                        </div>
+                    <div class="alert alert-danger">
+                        <i class="fa fa-exclamation-triangle"></i>
+                        ${errorMsg}
                     </div>
                 `);
-
-                // Re-attach cancel button handler with WebSocket support
-                statusDiv.find('.wallee-cancel-payment').on('click', async function() {
-                    $(this).prop('disabled', true).html(`<i class="fa fa-spinner fa-spin"></i> ${__('Cancelling...')}`);
-                    dialog.wallee_polling_active = false;
-                    // Set flag immediately to prevent polling from showing "Payment Failed"
-                    dialog.wallee_canceled_by_user = true;
-
-                    // Try WebSocket cancel first (real-time terminal cancellation)
-                    if (dialog.wallee_till_connection) {
-                        try {
-                            dialog.wallee_till_connection.cancel();
-                            await new Promise(resolve => setTimeout(resolve, 1000));
-                        } catch (wsError) {
-                            console.warn('WebSocket cancel failed:', wsError);
-                        }
-                    }
-
-                    try {
-                        const cancelResult = await frappe.xcall(
-                            'wallee_integration.wallee_integration.api.pos.cancel_terminal_payment',
-                            { transaction_name: transactionName }
-                        );
-
-                        // Show cancel success message
-                        const alertClass = cancelResult.requires_terminal_cancel ? 'alert-warning' : 'alert-success';
-                        const icon = cancelResult.requires_terminal_cancel ? 'fa-exclamation-triangle' : 'fa-ban';
-                        const message = cancelResult.message || __('Payment cancelled');
-
-                        statusDiv.html(`
-                            <div class="alert ${alertClass}">
-                                <i class="fa ${icon}"></i>
-                                ${message}
-                            </div>
-                        `);
-                        dialog.enable_primary_action();
-                        config.on_cancel();
-
-                        // Cleanup WebSocket
-                        if (dialog.wallee_till_connection) {
-                            dialog.wallee_till_connection = null;
-                        }
-                    } catch (cancelError) {
-                        const errorMsg = wallee_integration.extract_error_message(cancelError);
-                        statusDiv.html(`
-                            <div class="alert alert-danger">
-                                <i class="fa fa-exclamation-triangle"></i>
-                                ${errorMsg}
-                            </div>
-                        `);
-                        dialog.enable_primary_action();
-                    }
-                });
-
-                setTimeout(() => {
-                    wallee_integration.poll_payment_status(dialog, transactionName, config, attempts + 1);
-                }, pollInterval);
+                dialog.enable_primary_action();
             }
-        }
-    } catch (error) {
-        console.error('Status check error:', error);
-        // Continue polling on error
-        setTimeout(() => {
-            wallee_integration.poll_payment_status(dialog, transactionName, config, attempts + 1);
-        }, pollInterval);
+        });
+
+        return true;
     }
+
+    wallee_integration.unsubscribe_payment_status(dialog, transactionName);
+    return false;
 };
 
 /**
@@ -1,27 +1,235 @@
 # -*- coding: utf-8 -*-
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
 import frappe
 from frappe import _
 
+from wallee_integration.wallee_integration.api.client import get_settings, is_circuit_open
+from wallee_integration.wallee_integration.api.tracing import current_span, traced
+
+
+# Wallee states that may still change and need to be polled
+SYNC_STATUSES = ["Pending", "Processing", "Authorized"]
+
+DEFAULT_SYNC_CONCURRENCY = 8
+
+# Global default key holding the reconciliation watermark, suffixed with the space ID
+WATERMARK_KEY = "wallee_reconciled_until"
+
+# Re-read changes slightly older than the watermark to tolerate clock skew
+WATERMARK_OVERLAP_SECONDS = 60
+
+# Global default key holding transactions that failed to reconcile, suffixed with the space ID
+RETRY_KEY = "wallee_reconcile_retries"
 
+# Runs in which a failed transaction is retried before it is given up on
+MAX_RECONCILE_ATTEMPTS = 5
+
+
+@traced()
 def sync_pending_transactions():
-	"""Sync pending transactions with Wallee API"""
-	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import sync_transaction_status
+	"""
+	Sync pending transactions with Wallee API.
+
+	In "Full" sync mode every open transaction is re-read. Transactions are
+	read in pages through the Wallee search API, so a run costs one HTTP call
+	per page instead of one per transaction. Pages are fanned out over a
+	bounded thread pool (see ``sync_concurrency`` in Wallee Settings) while
+	every DB write happens on this job's own connection.
+
+	In "Incremental" sync mode only transactions whose state changed on Wallee
+	since the last reconciled watermark are read (see reconcile_changed_transactions).
+
+	The run is skipped while Wallee calls are suspended by the circuit breaker;
+	the next run catches up.
+
+	Returns:
+		dict: Run statistics (mode, total, synced, failed, duration, per_second)
+	"""
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		sync_transactions_bulk
+	)
+
+	if is_circuit_open():
+		frappe.logger("wallee_integration").warning("Wallee sync skipped: Wallee is unavailable")
+		return {"mode": "Skipped", "total": 0, "synced": 0, "failed": 0}
+
+	started = time.monotonic()
+
+	if get_settings().sync_mode == "Incremental":
+		stats = reconcile_changed_transactions()
+	else:
+		stats = sync_transactions_bulk(get_transactions_to_sync(), max_workers=get_sync_concurrency())
+		stats.pop("failed_transactions")
+		stats["skipped"] = len(stats.pop("skipped_transactions"))
+		stats["mode"] = "Full"
+
+	stats["duration"] = round(time.monotonic() - started, 3)
+	stats["per_second"] = round(stats["total"] / stats["duration"], 2) if stats["duration"] else 0
+
+	frappe.logger("wallee_integration").info(
+		"Wallee sync ({mode}): {total} transactions ({synced} synced, {failed} failed) "
+		"in {duration}s ({per_second}/s)".format(**stats)
+	)
+	frappe.cache().set_value("wallee_last_sync_stats", stats)
+
+	for key in ("mode", "total", "synced", "failed"):
+		current_span().set_attribute(f"sync.{key}", stats[key])
+
+	return stats
+
+
+def reconcile_changed_transactions():
+	"""
+	Update local transactions whose state changed on Wallee since the last run.
+
+	The watermark is stored per space and advanced once all changes were
+	read, even if some of them could not be applied: those transactions are
+	retried by name in the next runs, up to MAX_RECONCILE_ATTEMPTS times, so
+	a transaction that keeps failing cannot hold the watermark back. Without
+	a watermark (first run, or a new space) all pending transactions are
+	synced once and the watermark is initialised. Transactions skipped
+	because the circuit breaker opened are not counted as attempts, and an
+	interrupted initial sync leaves the watermark unset.
+
+	Returns:
+		dict: Run statistics (mode, total, synced, failed, retried, skipped)
+	"""
+	from wallee_integration.wallee_integration.api.client import get_space_id
+	from wallee_integration.wallee_integration.api.transaction import iter_transactions_changed_since
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		sync_transactions_bulk,
+		update_transactions_from_wallee
+	)
+
+	space_id = get_space_id()
+	watermark = get_reconcile_watermark(space_id)
+	retries = get_reconcile_retries(space_id)
+	run_started = datetime.now(timezone.utc)
 
-	# Get all pending transactions
-	pending_transactions = frappe.get_all(
+	if not watermark:
+		stats = sync_transactions_bulk(get_transactions_to_sync(), max_workers=get_sync_concurrency())
+		stats["mode"] = "Incremental (initial)"
+	else:
+		stats = {
+			"mode": "Incremental",
+			"total": 0,
+			"synced": 0,
+			"failed": 0,
+			"failed_transactions": [],
+			"skipped_transactions": []
+		}
+		since = watermark - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+
+		for transactions in iter_transactions_changed_since(since):
+			page_stats = update_transactions_from_wallee(transactions)
+			for key in ("total", "synced", "failed", "failed_transactions"):
+				stats[key] += page_stats[key]
+
+	skipped = stats.pop("skipped_transactions")
+	if not skipped:
+		set_reconcile_watermark(space_id, run_started)
+
+	failed = set(stats.pop("failed_transactions"))
+	stats["retried"] = len(retries)
+	skipped_retries = []
+
+	if retries and not skipped:
+		retry_stats = sync_transactions_bulk(
+			get_transactions_to_sync({"name": ["in", list(retries)]}), max_workers=get_sync_concurrency()
+		)
+		failed.update(retry_stats["failed_transactions"])
+		skipped_retries = retry_stats["skipped_transactions"]
+		stats["total"] += retry_stats["total"]
+		stats["synced"] += retry_stats["synced"]
+		stats["failed"] = len(failed)
+	elif retries:
+		skipped_retries = list(retries)
+
+	attempts = _count_attempts(failed.difference(skipped_retries), retries)
+	attempts.update({name: retries[name] for name in skipped_retries if name in retries})
+	set_reconcile_retries(space_id, attempts)
+
+	stats["skipped"] = len(skipped) + len(skipped_retries)
+
+	return stats
+
+
+def _count_attempts(failed, retries):
+	"""Attempts per failed transaction, dropping (and reporting) those that used up MAX_RECONCILE_ATTEMPTS."""
+	attempts = {name: retries.get(name, 0) + 1 for name in failed}
+
+	given_up = sorted(name for name, count in attempts.items() if count >= MAX_RECONCILE_ATTEMPTS)
+	if given_up:
+		frappe.log_error(
+			message=_("Failed to reconcile in {0} consecutive runs, no longer retried: {1}").format(
+				MAX_RECONCILE_ATTEMPTS, ", ".join(given_up)
+			),
+			title="Wallee Reconciliation Gave Up"
+		)
+
+	return {name: count for name, count in attempts.items() if count < MAX_RECONCILE_ATTEMPTS}
+
+
+def get_transactions_to_sync(filters=None):
+	"""
+	Get the rows passed to sync_transactions_bulk.
+
+	Args:
+		filters: Wallee Transaction filters (default: open transactions, see SYNC_STATUSES)
+
+	Returns:
+		list: Rows with name and transaction_id
+	"""
+	return frappe.get_all(
 		"Wallee Transaction",
-		filters={"status": ["in", ["Pending", "Processing", "Authorized"]]},
-		pluck="name"
+		filters=dict(filters or {"status": ["in", SYNC_STATUSES]}, transaction_id=["is", "set"]),
+		fields=["name", "transaction_id"]
 	)
 
-	for transaction_name in pending_transactions:
-		try:
-			sync_transaction_status(transaction_name)
-		except Exception as e:
-			frappe.log_error(
-				message=str(e),
-				title=f"Wallee Transaction Sync Error: {transaction_name}"
-			)
+
+def get_reconcile_watermark(space_id):
+	"""
+	Get the last reconciled point in time for a Wallee space.
+
+	Returns:
+		datetime: Timezone-aware UTC datetime, or None if never reconciled
+	"""
+	value = frappe.db.get_global(f"{WATERMARK_KEY}:{space_id}")
+	if not value:
+		return None
+	return datetime.fromisoformat(value)
+
+
+def set_reconcile_watermark(space_id, value):
+	"""Persist the last reconciled point in time for a Wallee space"""
+	frappe.db.set_global(f"{WATERMARK_KEY}:{space_id}", value.isoformat())
+	frappe.db.commit()
+
+
+def get_reconcile_retries(space_id):
+	"""
+	Get the transactions of a Wallee space that failed to reconcile.
+
+	Returns:
+		dict: Wallee Transaction name -> runs in which it failed so far
+	"""
+	value = frappe.db.get_global(f"{RETRY_KEY}:{space_id}")
+	return json.loads(value) if value else {}
+
+
+def set_reconcile_retries(space_id, retries):
+	"""Persist the transactions of a Wallee space to retry in the next run"""
+	frappe.db.set_global(f"{RETRY_KEY}:{space_id}", json.dumps(retries) if retries else None)
+	frappe.db.commit()
+
+
+def get_sync_concurrency():
+	"""Get the configured number of parallel Wallee requests for the sync job"""
+	concurrency = get_settings().sync_concurrency
+	return max(1, int(concurrency or DEFAULT_SYNC_CONCURRENCY))
 
 
 def cleanup_old_transactions():
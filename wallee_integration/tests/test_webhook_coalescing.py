@@ -0,0 +1,57 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from wallee_integration.api import _coalesce_webhooks, process_webhook_logs
+
+
+def _row(name, payload, creation="2026-01-01 00:00:00"):
+    return frappe._dict(name=name, request_payload=frappe.as_json(payload), creation=creation)
+
+
+def _transaction_event(transaction_id):
+    return {"listenerEntityTechnicalName": "Transaction", "entityId": transaction_id}
+
+
+def _completion_event(completion_id, transaction_id):
+    return {
+        "listenerEntityTechnicalName": "TransactionCompletion",
+        "entityId": completion_id,
+        "transactionId": transaction_id,
+    }
+
+
+@patch("wallee_integration.api._update_webhook_log")
+@patch("wallee_integration.api._dispatch_webhook", return_value=None)
+@patch("wallee_integration.wallee_integration.api.transaction.clear_transaction_completions_cache")
+class TestWebhookCoalescing(FrappeTestCase):
+    def test_completion_grouped_under_transaction(self, clear_cache, dispatch, update_log):
+        rows = [
+            _row("log-1", _transaction_event(42)),
+            _row("log-2", _completion_event(7, 42)),
+            _row("log-3", _transaction_event(42)),
+        ]
+
+        groups = _coalesce_webhooks(rows)
+        self.assertEqual(len(groups), 1)
+
+        process_webhook_logs(groups[0])
+
+        # Only the latest event is dispatched, the skipped completion still clears the cache
+        dispatch.assert_called_once_with(rows[-1].payload)
+        clear_cache.assert_called_once_with("42")
+
+    def test_transaction_events_keep_completions_cache(self, clear_cache, dispatch, update_log):
+        rows = [
+            _row("log-1", _transaction_event(42)),
+            _row("log-2", _transaction_event(42)),
+        ]
+
+        process_webhook_logs(_coalesce_webhooks(rows)[0])
+
+        dispatch.assert_called_once()
+        clear_cache.assert_not_called()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+Buffered sink for Wallee API call logs.
+
+Records are collected in memory for the current request or job, pushed to a
+Redis list in one round trip when it ends, and written to the Wallee API Log
+doctype in bulk by a scheduled job - so diagnostics never add a database
+insert to a Wallee call.
+"""
+
+import json
+
+import frappe
+from frappe.utils import now_datetime
+
+
+API_LOG_DOCTYPE = "Wallee API Log"
+API_LOG_QUEUE_KEY = "wallee_api_log_queue"
+
+# Payloads are stored as JSON truncated to this many characters
+MAX_PAYLOAD_LENGTH = 4000
+
+# Records buffered in memory before they are pushed to Redis mid-request
+FLUSH_THRESHOLD = 50
+
+# Records kept in Redis while waiting to be persisted (oldest are dropped)
+MAX_QUEUED_RECORDS = 50000
+
+PERSIST_BATCH_SIZE = 500
+
+API_LOG_FIELDS = (
+	"timestamp", "method", "endpoint", "status",
+	"user", "error", "request_data", "response_data"
+)
+
+
+def record_api_call(method, endpoint, request_data=None, response_data=None, error=None):
+	"""
+	Buffer an API call record for asynchronous persistence.
+
+	Payloads may be SDK models (serialised with ``to_dict``) or callables
+	returning the payload, so callers can defer the serialisation cost.
+	"""
+	buffer = _get_buffer()
+	buffer.append({
+		"timestamp": str(now_datetime()),
+		"method": method,
+		"endpoint": endpoint,
+		"status": "Error" if error else "Success",
+		"user": frappe.session.user if getattr(frappe.local, "session", None) else None,
+		"error": _truncate(str(error)) if error else None,
+		"request_data": _serialize(request_data),
+		"response_data": _serialize(response_data),
+	})
+
+	if len(buffer) >= FLUSH_THRESHOLD:
+		flush_api_log_buffer()
+
+
+def flush_api_log_buffer():
+	"""
+	Push buffered records to the Redis queue.
+
+	Runs after every request and background job; a failure here only drops
+	diagnostics and never affects the request itself.
+	"""
+	buffer = getattr(frappe.local, "wallee_api_log_buffer", None)
+	if not buffer:
+		return
+
+	frappe.local.wallee_api_log_buffer = []
+
+	try:
+		cache = frappe.cache()
+		key = cache.make_key(API_LOG_QUEUE_KEY)
+
+		pipeline = cache.pipeline()
+		pipeline.rpush(key, *[json.dumps(record) for record in buffer])
+		pipeline.ltrim(key, -MAX_QUEUED_RECORDS, -1)
+		pipeline.execute()
+	except Exception:
+		frappe.logger("wallee_integration").exception(
+			"Dropped {0} Wallee API log records".format(len(buffer))
+		)
+
+
+def persist_api_logs():
+	"""Write queued API call records to the Wallee API Log doctype in bulk."""
+	cache = frappe.cache()
+	lock = cache.lock(cache.make_key("wallee_api_log_persist"), timeout=600)
+
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		while True:
+			values = cache.lrange(API_LOG_QUEUE_KEY, 0, PERSIST_BATCH_SIZE - 1)
+			if not values:
+				break
+
+			_insert_records([json.loads(value) for value in values])
+			frappe.db.commit()
+
+			# Only this job consumes the list, new records are appended at the tail
+			cache.ltrim(API_LOG_QUEUE_KEY, len(values), -1)
+	finally:
+		lock.release()
+
+
+def _insert_records(records):
+	now = str(now_datetime())
+	fields = ("name", "creation", "modified", "owner", "modified_by") + API_LOG_FIELDS
+
+	values = [
+		(frappe.generate_hash(length=12), now, now, "Administrator", "Administrator")
+		+ tuple(record.get(field) for field in API_LOG_FIELDS)
+		for record in records
+	]
+
+	frappe.db.bulk_insert(API_LOG_DOCTYPE, fields=fields, values=values)
+
+
+def _get_buffer():
+	buffer = getattr(frappe.local, "wallee_api_log_buffer", None)
+	if buffer is None:
+		buffer = frappe.local.wallee_api_log_buffer = []
+	return buffer
+
+
+def _serialize(data):
+	if data is None:
+		return None
+
+	if callable(data):
+		data = data()
+
+	if hasattr(data, "to_dict"):
+		data = data.to_dict()
+
+	return _truncate(json.dumps(data, default=str, separators=(",", ":")))
+
+
+def _truncate(value):
+	if len(value) <= MAX_PAYLOAD_LENGTH:
+		return value
+
+	return "{0}... [{1} characters truncated]".format(
+		value[:MAX_PAYLOAD_LENGTH], len(value) - MAX_PAYLOAD_LENGTH
+	)
@@ -2,74 +2,531 @@
 # Copyright (c) 2024, Neoservice and contributors
 # For license information, please see license.txt
 
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+
 import frappe
 from frappe import _
+from frappe.utils import cint, flt
+
+from wallee_integration.wallee_integration.api.metrics import get_metrics_key, observe
+from wallee_integration.wallee_integration.api.tracing import span
+
+
+# Credential sets held in Wallee Settings: the main application user plus the
+# dedicated webshop and POS users created by the setup wizard
+CREDENTIAL_SETS = {
+	"main": ("user_id", "authentication_key"),
+	"webshop": ("webshop_user_id", "webshop_authentication_key"),
+	"pos": ("pos_user_id", "pos_authentication_key"),
+}
+
+# Maximum number of (site, credential set) clients kept per process
+MAX_CLIENTS = 32
+
+DEFAULT_HTTP_POOL_SIZE = 10
+DEFAULT_HTTP_TIMEOUT = 30
+
+# Attempts per Wallee call when it fails transiently (timeout, 429, 5xx)
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+# Longest wait before a retry, a longer Retry-After fails the call instead
+RETRY_MAX_DELAY = 8
+
+# Circuit breaker shared by all workers of a site: after CIRCUIT_FAILURE_THRESHOLD
+# transient failures within CIRCUIT_FAILURE_WINDOW seconds, Wallee calls fail
+# fast for CIRCUIT_OPEN_SECONDS
+CIRCUIT_FAILURE_THRESHOLD = 10
+CIRCUIT_FAILURE_WINDOW = 60
+CIRCUIT_OPEN_SECONDS = 30
+
+TRANSIENT_HTTP_STATUSES = (429, 500, 502, 503, 504)
+
+API_DURATION_METRIC = "wallee_api_request_duration_seconds"
+
+# Timeouts (s) for endpoints that legitimately take longer than the HTTP Timeout setting
+ENDPOINT_TIMEOUTS = {
+	# Waits for the customer to present a card on the terminal
+	"payment-terminals/{id}/perform-transaction": 300,
+	"payment-terminals/{id}/trigger-final-balance": 120,
+}
+
+# Longest wait (s) for a rate limit token per priority before the call fails
+RATE_LIMIT_MAX_WAIT = {
+	"interactive": 10,
+	"background": 60,
+}
+
+# Token bucket in Redis, refilled from the Redis clock so all workers agree.
+# Calls may only take a token while more than ARGV[3] tokens are left, which
+# lets interactive calls (floor 0) pre-empt background ones. Returns the
+# seconds to wait before retrying, "0" when a token was taken.
+RATE_LIMIT_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local floor = tonumber(ARGV[3])
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local wait = 0
+if tokens - 1 >= floor then
+	tokens = tokens - 1
+else
+	wait = (floor + 1 - tokens) / rate
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 60)
+
+return tostring(wait)
+"""
+
+# (site, credential set) -> _ClientEntry, least recently used first
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+class WalleeUnavailableError(frappe.ValidationError):
+	"""Wallee calls are suspended by the circuit breaker after repeated failures."""
+
+	http_status_code = 503
+
+
+class CircuitBreaker:
+	"""
+	Circuit breaker state of the current site, shared by all workers through Redis.
+
+	Keys are resolved on creation, so an instance can be handed to worker
+	threads that have no frappe context. For the same reason it also carries
+	the site's key for call duration metrics.
+	"""
+
+	def __init__(self):
+		self.cache = frappe.cache()
+		self.open_key = self.cache.make_key("wallee_circuit_open")
+		self.failures_key = self.cache.make_key("wallee_circuit_failures")
+		self.metrics_key = get_metrics_key(API_DURATION_METRIC)
+
+	def is_open(self):
+		return bool(self.cache.get(self.open_key))
+
+	def record_failure(self):
+		failures = self.cache.incr(self.failures_key)
+		if failures == 1:
+			self.cache.expire(self.failures_key, CIRCUIT_FAILURE_WINDOW)
+
+		# Once the open state expires, the next failure re-opens the circuit
+		# as long as the failures of the window are still counted
+		if failures >= CIRCUIT_FAILURE_THRESHOLD:
+			self.cache.set(self.open_key, 1, ex=CIRCUIT_OPEN_SECONDS, nx=True)
+
+
+class WalleeRateLimitError(WalleeUnavailableError):
+	"""No rate limit token became available within RATE_LIMIT_MAX_WAIT."""
+
+	http_status_code = 429
+
+
+class RateLimiter:
+	"""
+	Token bucket for one Wallee space and application user, shared through Redis.
+
+	The bucket is not site-prefixed: sites using the same Wallee credentials
+	share the same quota. Instances are attached to SDK services (see
+	get_service) and hold no frappe context, so they can be used from worker
+	threads.
+	"""
+
+	def __init__(self, space_id, user_id, rate, burst, reserve):
+		self.cache = frappe.cache()
+		self.key = "wallee_rate_limit|{0}|{1}".format(space_id, user_id)
+		self.rate = rate
+		self.burst = max(1, burst)
+		# Tokens background calls leave in the bucket for interactive ones
+		self.reserve = min(self.burst - 1, self.burst * reserve / 100)
+		self.script = self.cache.register_script(RATE_LIMIT_SCRIPT)
+
+	def acquire(self, priority="interactive"):
+		"""Block until a token is available, raise WalleeRateLimitError after RATE_LIMIT_MAX_WAIT."""
+		floor = self.reserve if priority == "background" else 0
+		deadline = time.monotonic() + RATE_LIMIT_MAX_WAIT.get(priority, RATE_LIMIT_MAX_WAIT["background"])
+
+		while True:
+			wait = flt(self.script(keys=[self.key], args=[self.rate, self.burst, floor]))
+			if not wait:
+				return
+
+			if time.monotonic() + wait > deadline:
+				raise WalleeRateLimitError(_("Too many requests to Wallee, please try again shortly"))
+
+			time.sleep(wait)
+
+
+class _ClientEntry:
+	"""A Wallee SDK configuration with the service instances built on it."""
+
+	def __init__(self, config, version, rate_limiter=None):
+		self.config = config
+		# "modified" timestamp of the settings the client was built from
+		self.version = version
+		# Shared by all services of the entry, None when no rate limit is set
+		self.rate_limiter = rate_limiter
+		# SDK service instances per class - each keeps its own HTTP connection pool
+		self.services = {}
+
+
+def get_settings():
+	"""
+	Get a read-only snapshot of Wallee Settings.
+
+	Served from the frappe document cache: kept in memory for the current
+	request and shared across workers through Redis. The cache is cleared
+	whenever the settings are saved (see clear_settings_cache).
+
+	Do not modify and save the returned document - use frappe.get_single for that.
+	"""
+	return frappe.get_cached_doc("Wallee Settings")
+
+
+def clear_settings_cache():
+	"""Invalidate the cached Wallee Settings and the client built from them"""
+	frappe.clear_document_cache("Wallee Settings", "Wallee Settings")
+	reset_client()
+
+
+def get_wallee_client(credential_set="main"):
+	"""
+	Get the configured Wallee API client for the current site.
+
+	Clients are kept in a per-process registry keyed by site and credential
+	set, so one worker can serve many sites without mixing tenants or
+	re-initialising clients on every request. The least recently used
+	clients are evicted beyond MAX_CLIENTS.
+
+	Args:
+		credential_set: "main", "webshop" or "pos". Falls back to the main
+			credentials when the dedicated user is not configured.
+
+	Returns:
+		Configuration: Wallee SDK configuration
+	"""
+	return _get_client_entry(credential_set).config
+
+
+def get_service(service_class, credential_set="main"):
+	"""
+	Get a Wallee SDK service bound to the current site's client.
+
+	Service instances are cached with their client, so their keep-alive
+	connection pool is reused across calls instead of opening a new TCP/TLS
+	connection for every request.
+
+	Args:
+		service_class: SDK service class, e.g. TransactionsService
+		credential_set: "main", "webshop" or "pos" (see get_wallee_client)
+
+	Returns:
+		Instance of service_class
+	"""
+	entry = _get_client_entry(credential_set)
+
+	service = entry.services.get(service_class)
+	if service is None:
+		service = service_class(entry.config)
+		_apply_request_timeout(service, getattr(entry.config, "wallee_request_timeout", None))
+		# Picked up by call_api from the bound service method
+		service.wallee_rate_limiter = entry.rate_limiter
+		entry.services[service_class] = service
+
+	return service
+
+
+def _get_client_entry(credential_set="main"):
+	"""Get or lazily create the registry entry for the current site."""
+	settings = get_settings()
+	credential_set = _resolve_credential_set(settings, credential_set)
+	key = (frappe.local.site, credential_set)
+	version = str(settings.modified)
 
+	with _clients_lock:
+		entry = _clients.get(key)
+		# Rebuild when the settings were saved since, possibly by another worker
+		if entry is not None and entry.version == version:
+			_clients.move_to_end(key)
+			return entry
 
-_wallee_client = None
+	entry = _ClientEntry(
+		_build_client(settings, credential_set),
+		version,
+		_build_rate_limiter(settings, credential_set)
+	)
 
+	with _clients_lock:
+		_clients[key] = entry
+		_clients.move_to_end(key)
+		while len(_clients) > MAX_CLIENTS:
+			_clients.popitem(last=False)
 
-def get_wallee_client():
-	"""Get configured Wallee API client singleton"""
-	global _wallee_client
+	return entry
 
-	if _wallee_client is not None:
-		return _wallee_client
 
-	settings = frappe.get_single("Wallee Settings")
+def _resolve_credential_set(settings, credential_set):
+	"""Fall back to the main credentials when a dedicated user is not set up."""
+	if credential_set not in CREDENTIAL_SETS:
+		frappe.throw(_("Unknown Wallee credential set: {0}").format(credential_set))
 
+	user_field, key_field = CREDENTIAL_SETS[credential_set]
+	if credential_set != "main" and not (settings.get(user_field) and settings.get(key_field)):
+		return "main"
+
+	return credential_set
+
+
+def _build_client(settings, credential_set):
+	"""Create a Wallee SDK configuration for one credential set."""
 	if not settings.enabled:
 		frappe.throw(_("Wallee Integration is not enabled"))
 
 	if not all([settings.user_id, settings.authentication_key, settings.space_id]):
 		frappe.throw(_("Wallee credentials are not configured"))
 
+	user_field, key_field = CREDENTIAL_SETS[credential_set]
+
 	try:
 		from wallee.configuration import Configuration
 
 		host = settings.api_host or "https://app-wallee.com/api/v2.0"
 
-		_wallee_client = Configuration(
-			user_id=settings.user_id,
-			authentication_key=settings.get_password("authentication_key"),
+		config = Configuration(
+			user_id=settings.get(user_field),
+			authentication_key=settings.get_password(key_field),
 			host=host
 		)
 
-		return _wallee_client
+		# Keep enough warm connections for the parallel sync as well as interactive calls
+		pool_size = max(
+			cint(settings.get("http_pool_size")) or DEFAULT_HTTP_POOL_SIZE,
+			cint(settings.get("sync_concurrency"))
+		)
+		if hasattr(config, "connection_pool_maxsize"):
+			config.connection_pool_maxsize = pool_size
+		config.wallee_request_timeout = flt(settings.get("http_timeout")) or DEFAULT_HTTP_TIMEOUT
+
+		return config
 	except ImportError:
 		frappe.throw(_("Wallee Python SDK is not installed. Please run: pip install wallee"))
 	except Exception as e:
 		frappe.throw(_("Failed to initialize Wallee client: {0}").format(str(e)))
 
 
+def _build_rate_limiter(settings, credential_set):
+	"""Create the rate limiter for one credential set, None when the rate limit is disabled."""
+	rate = flt(settings.get("rate_limit"))
+	if rate <= 0:
+		return None
+
+	user_field = CREDENTIAL_SETS[credential_set][0]
+
+	return RateLimiter(
+		settings.space_id,
+		settings.get(user_field),
+		rate,
+		cint(settings.get("rate_limit_burst")) or 1,
+		flt(settings.get("rate_limit_reserve"))
+	)
+
+
+def _apply_request_timeout(service, timeout):
+	"""Set the default timeout on the urllib3 pool manager behind an SDK service."""
+	api_client = getattr(service, "api_client", None)
+	pool_manager = getattr(getattr(api_client, "rest_client", None), "pool_manager", None)
+
+	if pool_manager is None or not timeout:
+		return
+
+	import urllib3
+
+	pool_manager.connection_pool_kw["timeout"] = urllib3.Timeout(total=timeout)
+
+
+def call_api(endpoint, fn, *args, idempotent=True, breaker=None, priority=None, **kwargs):
+	"""
+	Call a Wallee SDK service method with retries and the shared circuit breaker.
+
+	Transient failures (timeouts, connection errors, 429, 5xx) are retried
+	with jittered exponential backoff, honouring Retry-After. Calls that are
+	not idempotent are only retried on 429, where Wallee did not process the
+	request. While the circuit is open, calls fail at once with
+	WalleeUnavailableError instead of waiting on a failing upstream.
+
+	Every attempt takes a token from the rate limiter of the service's
+	credential set, if a rate limit is configured. Background calls leave
+	a reserve of tokens to interactive ones.
+
+	The duration of the call, retries included, is recorded per endpoint
+	and outcome (see api.metrics) and traced as a span (see api.tracing).
+
+	Args:
+		endpoint: Endpoint template, e.g. "payment/transactions/{id}"
+			(used for ENDPOINT_TIMEOUTS)
+		fn: Bound SDK service method
+		*args: Positional arguments for fn
+		idempotent: Whether the call may be repeated after a timeout or 5xx
+		breaker: CircuitBreaker to use (default: the current site's)
+		priority: "interactive" or "background" (default: see get_call_priority)
+		**kwargs: Keyword arguments for fn
+
+	Returns:
+		The SDK method's return value
+	"""
+	breaker = breaker or CircuitBreaker()
+	start = time.monotonic()
+	status = "ok"
+
+	with span(f"wallee {endpoint}", endpoint=endpoint) as current:
+		try:
+			return _call_with_retries(endpoint, fn, args, kwargs, idempotent, breaker, priority)
+		except Exception as e:
+			status = str(getattr(e, "status", None) or type(e).__name__)
+			raise
+		finally:
+			observe(API_DURATION_METRIC, time.monotonic() - start, (endpoint, status), key=breaker.metrics_key)
+			current.set_attribute("status", status)
+
+
+def _call_with_retries(endpoint, fn, args, kwargs, idempotent, breaker, priority):
+	if breaker.is_open():
+		raise WalleeUnavailableError(_("Wallee is temporarily unavailable, please try again shortly"))
+
+	if endpoint in ENDPOINT_TIMEOUTS:
+		kwargs.setdefault("_request_timeout", ENDPOINT_TIMEOUTS[endpoint])
+
+	rate_limiter = getattr(getattr(fn, "__self__", None), "wallee_rate_limiter", None)
+	if rate_limiter:
+		priority = priority or get_call_priority()
+
+	attempt = 0
+	while True:
+		attempt += 1
+		if rate_limiter:
+			rate_limiter.acquire(priority)
+
+		try:
+			return fn(*args, **kwargs)
+		except Exception as e:
+			status = getattr(e, "status", None)
+			if not _is_transient_error(e, status):
+				raise
+
+			# Throttling is not an outage
+			if status != 429:
+				breaker.record_failure()
+
+			if attempt >= MAX_ATTEMPTS or not (idempotent or status == 429) or breaker.is_open():
+				raise
+
+			delay = _get_retry_delay(e, attempt)
+			if delay is None:
+				raise
+
+			time.sleep(delay)
+
+
+def get_call_priority():
+	"""
+	Rate limit priority of calls made from the current context.
+
+	Set with set_call_priority, or passed to call_api, where the context does
+	not tell: otherwise calls inside a web request are interactive and calls
+	in jobs are background.
+	"""
+	priority = getattr(frappe.local, "wallee_call_priority", None)
+	if priority:
+		return priority
+
+	if getattr(frappe.local, "request", None) is not None:
+		return "interactive"
+
+	return "background"
+
+
+def set_call_priority(priority):
+	"""Rate limit priority of the Wallee calls made for the rest of the current request or job."""
+	frappe.local.wallee_call_priority = priority
+
+
+def is_circuit_open():
+	"""Whether Wallee calls of the current site are suspended by the circuit breaker."""
+	return CircuitBreaker().is_open()
+
+
+def _is_transient_error(error, status=None):
+	if status in TRANSIENT_HTTP_STATUSES:
+		return True
+
+	if isinstance(error, (TimeoutError, ConnectionError, socket.timeout)):
+		return True
+
+	import urllib3
+
+	return isinstance(error, urllib3.exceptions.HTTPError)
+
+
+def _get_retry_delay(error, attempt):
+	"""Seconds to wait before the next attempt, None when Retry-After asks for too long."""
+	backoff = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+	delay = random.uniform(backoff / 2, backoff)
+
+	headers = getattr(error, "headers", None) or {}
+	retry_after = flt(headers.get("Retry-After")) if hasattr(headers, "get") else 0
+	if retry_after > RETRY_MAX_DELAY:
+		return None
+
+	return max(delay, retry_after)
+
+
 def get_space_id():
 	"""Get the configured Wallee Space ID"""
-	settings = frappe.get_single("Wallee Settings")
-	return settings.space_id
+	return get_settings().space_id
 
 
 def log_api_call(method, endpoint, request_data=None, response_data=None, error=None):
-	"""Log API calls if logging is enabled"""
-	settings = frappe.get_single("Wallee Settings")
+	"""
+	Log API calls if logging is enabled.
 
-	if not settings.log_api_calls:
+	Records are buffered and written to Wallee API Log by a background job,
+	see ``api_log.record_api_call`` for the accepted payload types.
+	"""
+	if not get_settings().log_api_calls:
 		return
 
-	frappe.get_doc({
-		"doctype": "Error Log",
-		"method": f"Wallee API: {method} {endpoint}",
-		"error": frappe.as_json({
-			"request": request_data,
-			"response": response_data,
-			"error": str(error) if error else None
-		})
-	}).insert(ignore_permissions=True)
+	from wallee_integration.wallee_integration.api.api_log import record_api_call
 
+	record_api_call(method, endpoint, request_data, response_data, error)
 
-def reset_client():
-	"""Reset the cached client (useful after settings change)"""
-	global _wallee_client
-	_wallee_client = None
+
+def reset_client(site=None):
+	"""
+	Reset the cached clients and their services (useful after settings change).
+
+	Args:
+		site: Site whose clients are dropped (default: current site).
+			Clients of other sites served by this process are kept.
+	"""
+	site = site or frappe.local.site
+
+	with _clients_lock:
+		for key in [key for key in _clients if key[0] == site]:
+			del _clients[key]
 
 
 @frappe.whitelist()
@@ -83,14 +540,13 @@ def test_connection():
 	try:
 		from wallee import TransactionsService
 
-		config = get_wallee_client()
 		space_id = get_space_id()
 
 		# Test connection by listing transactions (will fail if credentials are invalid)
-		service = TransactionsService(config)
+		service = get_service(TransactionsService)
 
 		# This will throw an exception if credentials are invalid
-		service.get_payment_transactions(space_id)
+		call_api("payment/transactions", service.get_payment_transactions, space_id)
 
 		log_api_call("GET", "payment/transactions", {"test": True}, {"success": True})
 
@@ -118,11 +574,14 @@ def get_available_payment_methods():
 	try:
 		from wallee.service.payment_method_configurations_service import PaymentMethodConfigurationsService
 
-		config = get_wallee_client()
 		space_id = get_space_id()
 
-		service = PaymentMethodConfigurationsService(config)
-		response = service.get_all_payment_method_configurations(space_id)
+		service = get_service(PaymentMethodConfigurationsService)
+		response = call_api(
+			"payment/method-configurations",
+			service.get_all_payment_method_configurations,
+			space_id
+		)
 
 		# Extract method list from response
 		methods_list = getattr(response, 'data', None) or getattr(response, 'items', None) or response or []
@@ -5,16 +5,27 @@
 import frappe
 from frappe import _
 from wallee_integration.wallee_integration.api.client import (
-	get_wallee_client,
+	call_api,
+	get_service,
+	get_settings,
 	get_space_id,
 	log_api_call
 )
 
 
+# Transaction ID -> ID of its current invoice, remembered once seen
+INVOICE_CACHE_KEY = "wallee_transaction_invoice"
+INVOICE_CACHE_TTL = 7 * 24 * 60 * 60
+
+
 def get_transaction_invoice(transaction_id):
 	"""
 	Find the TransactionInvoice linked to a given transaction.
 
+	Reads the invoice directly when its ID is already known, otherwise
+	searches the space for the invoice linked to the transaction - a single
+	Wallee request either way.
+
 	Args:
 		transaction_id: Wallee transaction ID
 
@@ -23,23 +34,47 @@ def get_transaction_invoice(transaction_id):
 	"""
 	from wallee.service.transaction_invoices_service import TransactionInvoicesService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = TransactionInvoicesService(config)
+	service = get_service(TransactionInvoicesService)
+
+	invoice_id = get_cached_invoice_id(transaction_id)
 
 	try:
-		response = service.get_payment_transactions_invoices(space_id, limit=100)
-		log_api_call("GET", "payment/transactions/invoices", {"transaction_id": transaction_id})
+		if invoice_id:
+			invoice = call_api(
+				"payment/transactions/invoices/{id}",
+				service.get_payment_transactions_invoices_id,
+				invoice_id,
+				space_id
+			)
+			log_api_call(
+				"GET", f"payment/transactions/invoices/{invoice_id}",
+				{"transaction_id": transaction_id}, {"id": invoice_id}
+			)
+			return invoice
+
+		query = f"linkedTransaction:{int(transaction_id)}"
+		response = call_api(
+			"payment/transactions/invoices/search",
+			service.get_payment_transactions_invoices_search,
+			space_id, query=query, limit=1, order="createdOn DESC"
+		)
 
 		# Response is InvoiceListResponse - extract the list of invoices
 		invoices = getattr(response, "data", None) or getattr(response, "items", None) or []
 		if isinstance(response, list):
 			invoices = response
 
-		for invoice in invoices:
-			linked_tx = getattr(invoice, "linked_transaction", None)
-			if linked_tx and int(linked_tx) == int(transaction_id):
-				return invoice
+		invoice = invoices[0] if invoices else None
+		log_api_call(
+			"GET", "payment/transactions/invoices/search",
+			{"query": query}, {"id": getattr(invoice, "id", None)}
+		)
+
+		if invoice and getattr(invoice, "id", None):
+			cache_invoice_id(transaction_id, invoice.id)
+
+		return invoice
 
 	except Exception as e:
 		log_api_call("GET", "payment/transactions/invoices", {"transaction_id": transaction_id}, error=e)
@@ -48,6 +83,20 @@ def get_transaction_invoice(transaction_id):
 	return None
 
 
+def get_cached_invoice_id(transaction_id):
+	"""Get the ID of the invoice last seen for a transaction."""
+	return frappe.cache().get_value(f"{INVOICE_CACHE_KEY}:{get_space_id()}:{transaction_id}")
+
+
+def cache_invoice_id(transaction_id, invoice_id):
+	"""Remember the current invoice of a transaction (e.g. after a replacement)."""
+	frappe.cache().set_value(
+		f"{INVOICE_CACHE_KEY}:{get_space_id()}:{transaction_id}",
+		int(invoice_id),
+		expires_in_sec=INVOICE_CACHE_TTL
+	)
+
+
 def replace_invoice(invoice_id, line_items, sent_to_customer=False,
 					external_id=None, merchant_reference=None, billing_address=None):
 	"""
@@ -67,9 +116,8 @@ def replace_invoice(invoice_id, line_items, sent_to_customer=False,
 	from wallee.service.transaction_invoices_service import TransactionInvoicesService
 	from wallee.models.transaction_invoice_replacement import TransactionInvoiceReplacement
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = TransactionInvoicesService(config)
+	service = get_service(TransactionInvoicesService)
 
 	if not external_id:
 		external_id = f"inv-replace-{invoice_id}-{frappe.generate_hash()[:8]}"
@@ -83,7 +131,9 @@ def replace_invoice(invoice_id, line_items, sent_to_customer=False,
 	)
 
 	try:
-		response = service.post_payment_transactions_invoices_id_replace(
+		response = call_api(
+			"payment/transactions/invoices/{id}/replace",
+			service.post_payment_transactions_invoices_id_replace,
 			invoice_id,
 			space_id,
 			transaction_invoice_replacement=replacement
@@ -120,7 +170,7 @@ def manage_invoice_after_completion(transaction_id, local_transaction_name=None)
 	from wallee import LineItemCreate, LineItemType, TaxCreate
 
 	try:
-		settings = frappe.get_single("Wallee Settings")
+		settings = get_settings()
 		send_to_customer = bool(settings.get("send_invoice_to_customer"))
 
 		# Find the invoice for this transaction
@@ -159,13 +209,17 @@ def manage_invoice_after_completion(transaction_id, local_transaction_name=None)
 
 		# Replace the invoice
 		merchant_ref = getattr(invoice, "merchant_reference", None)
-		replace_invoice(
+		replacement = replace_invoice(
 			invoice_id=invoice_id,
 			line_items=rebuilt_line_items,
 			sent_to_customer=send_to_customer,
 			merchant_reference=merchant_ref
 		)
 
+		# The replacement is a new invoice, the replaced one is no longer current
+		if getattr(replacement, "id", None):
+			cache_invoice_id(transaction_id, replacement.id)
+
 	except Exception as e:
 		frappe.log_error(
 			"Wallee Invoice Management Error",
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+Latency histograms for Wallee calls and payment flows, in Prometheus format.
+
+Observations are aggregated in process memory and added to per-site Redis
+hashes in one round trip after each request and background job, so workers
+share the totals without a Redis write per call. The ``metrics`` endpoint
+renders them together with gauges read at scrape time (webhook queue, sync
+backlog, last sync run).
+"""
+
+import hmac
+import threading
+
+import frappe
+from werkzeug.wrappers import Response
+
+
+# Histogram name -> (help text, label names, bucket upper bounds in seconds)
+HISTOGRAMS = {
+	"wallee_api_request_duration_seconds": (
+		"Duration of Wallee API calls, including retries",
+		("endpoint", "status"),
+		(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+	),
+	"wallee_webhook_lag_seconds": (
+		"Time between receipt and processing of queued webhook events",
+		(),
+		(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+	),
+	"wallee_pos_time_to_authorize_seconds": (
+		"Time from creating a terminal payment until it is authorized",
+		(),
+		(5, 10, 15, 20, 30, 45, 60, 90, 120, 300),
+	),
+}
+
+METRICS_KEY = "wallee_metrics"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (Redis key, labels) -> [count per bucket..., count above the last bucket, sum]
+_buffer = {}
+_buffer_lock = threading.Lock()
+
+
+def get_metrics_key(name):
+	"""Redis hash of a histogram for the current site (resolve before handing to worker threads)."""
+	return frappe.cache().make_key(f"{METRICS_KEY}:{name}")
+
+
+def observe(name, seconds, labels=(), key=None):
+	"""
+	Record an observation in the process buffer.
+
+	Args:
+		name: Histogram name from HISTOGRAMS
+		seconds: Observed value
+		labels: Label values, in the order of the histogram's label names
+		key: Redis key from get_metrics_key, required outside the frappe context
+	"""
+	buckets = HISTOGRAMS[name][2]
+	key = key or get_metrics_key(name)
+	index = next((i for i, bound in enumerate(buckets) if seconds <= bound), len(buckets))
+
+	with _buffer_lock:
+		values = _buffer.get((key, labels))
+		if values is None:
+			values = _buffer[(key, labels)] = [0] * (len(buckets) + 2)
+		values[index] += 1
+		values[-1] += seconds
+
+
+def flush_metrics():
+	"""
+	Add the buffered observations of this process to Redis.
+
+	Runs after every request and background job; buffered observations of
+	every site served by the process are flushed, their keys carry the site.
+	"""
+	global _buffer
+
+	with _buffer_lock:
+		if not _buffer:
+			return
+		buffer, _buffer = _buffer, {}
+
+	try:
+		pipeline = frappe.cache().pipeline()
+		for (key, labels), values in buffer.items():
+			prefix = "|".join(labels)
+			for index, count in enumerate(values[:-1]):
+				if count:
+					pipeline.hincrby(key, f"{prefix}|{index}", count)
+			pipeline.hincrbyfloat(key, f"{prefix}|sum", values[-1])
+		pipeline.execute()
+	except Exception:
+		frappe.logger("wallee_integration").exception("Dropped Wallee metrics")
+
+
+@frappe.whitelist(allow_guest=True)
+def metrics(token=None):
+	"""
+	Prometheus scrape endpoint.
+
+	Authenticates with the Metrics Token of Wallee Settings, sent as
+	``Authorization: Bearer <token>`` or ``?token=``; without a token the
+	caller must be a System Manager.
+	"""
+	_check_access(token)
+
+	# Raw pipeline: the cache wrapper's hgetall expects pickled values
+	pipeline = frappe.cache().pipeline()
+	for name in HISTOGRAMS:
+		pipeline.hgetall(get_metrics_key(name))
+
+	lines = []
+	for name, stored in zip(HISTOGRAMS, pipeline.execute()):
+		lines.extend(_render_histogram(name, stored or {}))
+	lines.extend(_render_gauges())
+
+	return Response("\n".join(lines) + "\n", content_type=CONTENT_TYPE)
+
+
+def _check_access(token=None):
+	from wallee_integration.wallee_integration.api.client import get_settings
+
+	settings = get_settings()
+	if settings.get("metrics_token"):
+		header = frappe.get_request_header("Authorization") or ""
+		token = token or (header[len("Bearer "):] if header.startswith("Bearer ") else None)
+		expected = settings.get_password("metrics_token", raise_exception=False)
+
+		if token and expected and hmac.compare_digest(token.encode(), expected.encode()):
+			return
+
+	frappe.only_for("System Manager")
+
+
+def _render_histogram(name, stored):
+	help_text, label_names, buckets = HISTOGRAMS[name]
+
+	# labels -> [count per bucket..., count above the last bucket, sum]
+	series = {}
+	for field, value in stored.items():
+		field = frappe.safe_decode(field)
+		prefix, _, slot = field.rpartition("|")
+		values = series.setdefault(prefix, [0] * (len(buckets) + 2))
+		if slot == "sum":
+			values[-1] = float(value)
+		else:
+			values[int(slot)] = int(value)
+
+	lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+
+	for prefix, values in sorted(series.items()):
+		labels = dict(zip(label_names, prefix.split("|"))) if label_names else {}
+		cumulative = 0
+		for bound, count in zip(buckets + ("+Inf",), values[:-1]):
+			cumulative += count
+			lines.append(_sample(f"{name}_bucket", dict(labels, le=str(bound)), cumulative))
+		lines.append(_sample(f"{name}_sum", labels, round(values[-1], 6)))
+		lines.append(_sample(f"{name}_count", labels, cumulative))
+
+	return lines
+
+
+def _render_gauges():
+	from wallee_integration.api import _get_webhook_queue_stats
+	from wallee_integration.tasks import SYNC_STATUSES
+
+	queue = _get_webhook_queue_stats()
+	last_sync = frappe.cache().get_value("wallee_last_sync_stats") or {}
+
+	gauges = [
+		("wallee_webhook_queue_depth", "Queued webhook events waiting to be processed", queue["depth"]),
+		("wallee_webhook_queue_oldest_seconds", "Age of the oldest queued webhook event", queue["oldest_lag"]),
+		(
+			"wallee_sync_backlog",
+			"Open Wallee Transactions polled by the scheduled sync",
+			frappe.db.count("Wallee Transaction", {"status": ["in", SYNC_STATUSES]})
+		),
+		("wallee_sync_last_duration_seconds", "Duration of the last sync run", last_sync.get("duration") or 0),
+		("wallee_sync_last_failed", "Transactions that failed to sync in the last run", last_sync.get("failed") or 0),
+		("wallee_circuit_open", "1 while Wallee calls are suspended by the circuit breaker", _circuit_open()),
+	]
+
+	lines = []
+	for name, help_text, value in gauges:
+		lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", _sample(name, {}, value)])
+
+	return lines
+
+
+def _circuit_open():
+	from wallee_integration.wallee_integration.api.client import is_circuit_open
+
+	return int(is_circuit_open())
+
+
+def _sample(name, labels, value):
+	if not labels:
+		return f"{name} {value}"
+
+	rendered = ",".join(
+		'{0}="{1}"'.format(label, str(label_value).replace("\\", "\\\\").replace('"', '\\"'))
+		for label, label_value in labels.items()
+	)
+	return f"{name}{{{rendered}}} {value}"
@@ -5,7 +5,9 @@
 import frappe
 from frappe import _
 from wallee_integration.wallee_integration.api.client import (
-	get_wallee_client,
+	call_api,
+	get_service,
+	get_settings,
 	get_space_id,
 	log_api_call
 )
@@ -27,9 +29,8 @@ def create_payment_link(name, amount, currency, **kwargs):
 	from wallee.service.payment_links_service import PaymentLinksService
 	from wallee.models import PaymentLinkCreate, LineItemCreate
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentLinksService(config)
+	service = get_service(PaymentLinksService)
 
 	line_item = LineItemCreate(
 		name=name,
@@ -51,8 +52,8 @@ def create_payment_link(name, amount, currency, **kwargs):
 		link_create.billing_address = kwargs["billing_address"]
 
 	try:
-		response = service.create(space_id, link_create)
-		log_api_call("POST", "payment-links", link_create.to_dict(), response.to_dict())
+		response = call_api("payment-links", service.create, space_id, link_create, idempotent=False)
+		log_api_call("POST", "payment-links", link_create, response)
 		return {
 			"id": response.id,
 			"name": response.name,
@@ -61,7 +62,7 @@ def create_payment_link(name, amount, currency, **kwargs):
 			"external_id": response.external_id,
 		}
 	except Exception as e:
-		log_api_call("POST", "payment-links", link_create.to_dict(), error=e)
+		log_api_call("POST", "payment-links", link_create, error=e)
 		raise
 
 
@@ -69,13 +70,12 @@ def get_payment_link(link_id):
 	"""Get payment link details"""
 	from wallee.service.payment_links_service import PaymentLinksService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentLinksService(config)
+	service = get_service(PaymentLinksService)
 
 	try:
-		response = service.read(space_id, link_id)
-		log_api_call("GET", f"payment-links/{link_id}", response_data=response.to_dict())
+		response = call_api("payment-links/{id}", service.read, space_id, link_id)
+		log_api_call("GET", f"payment-links/{link_id}", response_data=response)
 		return {
 			"id": response.id,
 			"name": response.name,
@@ -93,12 +93,11 @@ def update_payment_link(link_id, **kwargs):
 	from wallee.service.payment_links_service import PaymentLinksService
 	from wallee.models import PaymentLinkUpdate
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentLinksService(config)
+	service = get_service(PaymentLinksService)
 
 	# First, read the current link
-	current = service.read(space_id, link_id)
+	current = call_api("payment-links/{id}", service.read, space_id, link_id)
 
 	link_update = PaymentLinkUpdate(
 		id=link_id,
@@ -107,11 +106,11 @@ def update_payment_link(link_id, **kwargs):
 	)
 
 	try:
-		response = service.update(space_id, link_update)
-		log_api_call("PUT", f"payment-links/{link_id}", link_update.to_dict(), response.to_dict())
+		response = call_api("payment-links/{id}", service.update, space_id, link_update, idempotent=False)
+		log_api_call("PUT", f"payment-links/{link_id}", link_update, response)
 		return response
 	except Exception as e:
-		log_api_call("PUT", f"payment-links/{link_id}", link_update.to_dict(), error=e)
+		log_api_call("PUT", f"payment-links/{link_id}", link_update, error=e)
 		raise
 
 
@@ -123,7 +122,7 @@ def create_payment_link_for_invoice(sales_invoice):
 	else:
 		invoice = sales_invoice
 
-	settings = frappe.get_single("Wallee Settings")
+	settings = get_settings()
 	if not settings.enabled:
 		frappe.throw(_("Wallee Integration is not enabled"))
 
@@ -2,16 +2,23 @@
 # Copyright (c) 2024, Neoservice and contributors
 # For license information, please see license.txt
 
+import time
+
 import frappe
 from frappe import _
+from frappe.utils import flt
 from wallee_integration.wallee_integration.api.client import (
-	get_wallee_client,
+	call_api,
+	get_service,
+	get_settings,
 	get_space_id,
 	log_api_call
 )
+from wallee_integration.wallee_integration.api.tracing import current_span, get_trace_context, span, traced
 
 
 @frappe.whitelist()
+@traced()
 def initiate_terminal_payment(amount, currency, terminal=None, pos_invoice=None, customer=None, pos_profile=None):
 	"""
 	Initiate a terminal payment for POS
@@ -36,7 +43,7 @@ def initiate_terminal_payment(amount, currency, terminal=None, pos_invoice=None,
 		get_default_terminal
 	)
 
-	settings = frappe.get_single("Wallee Settings")
+	settings = get_settings()
 
 	if not settings.enabled or not settings.enable_pos_terminal:
 		frappe.throw(_("POS Terminal payments are not enabled"))
@@ -86,6 +93,7 @@ def initiate_terminal_payment(amount, currency, terminal=None, pos_invoice=None,
 
 	transaction_id = transaction.get("transaction_id")
 	merchant_reference = pos_invoice or frappe.generate_hash()[:16]
+	current_span().set_transaction(transaction_id)
 
 	# Determine reference document
 	# Priority: POS Invoice > POS Profile
@@ -100,27 +108,30 @@ def initiate_terminal_payment(amount, currency, terminal=None, pos_invoice=None,
 		ref_name = None
 
 	# Create local transaction record
-	local_transaction = create_transaction_record(
-		transaction_id=transaction_id,
-		amount=amount,
-		currency=currency,
-		transaction_type="Terminal",
-		terminal=terminal_doc.name,
-		reference_doctype=ref_doctype,
-		reference_name=ref_name,
-		customer=customer,
-		merchant_reference=merchant_reference
-	)
+	with span("db insert Wallee Transaction", transaction_id=transaction_id):
+		local_transaction = create_transaction_record(
+			transaction_id=transaction_id,
+			amount=amount,
+			currency=currency,
+			transaction_type="Terminal",
+			terminal=terminal_doc.name,
+			reference_doctype=ref_doctype,
+			reference_name=ref_name,
+			customer=customer,
+			merchant_reference=merchant_reference
+		)
 
 	# Initiate payment on terminal in background
 	# This returns immediately so frontend can show "Waiting" status with Cancel button
-	frappe.enqueue(
-		"wallee_integration.wallee_integration.api.pos.process_terminal_async",
-		queue="short",
-		terminal_id=terminal_doc.terminal_id,
-		transaction_id=transaction_id,
-		transaction_name=local_transaction.name
-	)
+	with span("enqueue process_terminal_async", transaction_id=transaction_id):
+		frappe.enqueue(
+			"wallee_integration.wallee_integration.api.pos.process_terminal_async",
+			queue="short",
+			terminal_id=terminal_doc.terminal_id,
+			transaction_id=transaction_id,
+			transaction_name=local_transaction.name,
+			trace_context=get_trace_context()
+		)
 
 	return {
 		"success": True,
@@ -135,12 +146,15 @@ def initiate_terminal_payment(amount, currency, terminal=None, pos_invoice=None,
 	}
 
 
+@traced()
 def process_terminal_async(terminal_id, transaction_id, transaction_name):
 	"""Background job to process terminal payment"""
 	from wallee_integration.wallee_integration.api.terminal import initiate_terminal_transaction
 
+	current_span().set_transaction(transaction_id)
+
 	try:
-		initiate_terminal_transaction(terminal_id, transaction_id)
+		initiate_terminal_transaction(terminal_id, transaction_id, priority="interactive")
 	except Exception as e:
 		error_str = str(e).lower()
 		# Check if the transaction was canceled - this is expected when user clicks Cancel
@@ -159,6 +173,7 @@ def process_terminal_async(terminal_id, transaction_id, transaction_name):
 
 
 @frappe.whitelist()
+@traced()
 def check_terminal_payment_status(transaction_name):
 	"""
 	Check the status of a terminal payment
@@ -171,6 +186,9 @@ def check_terminal_payment_status(transaction_name):
 	"""
 	from wallee_integration.wallee_integration.api.transaction import get_full_transaction
 	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		COMPLETED_STATUSES,
+		FAILED_STATUSES,
+		get_transaction_status_payload,
 		update_transaction_from_wallee
 	)
 
@@ -183,45 +201,66 @@ def check_terminal_payment_status(transaction_name):
 			"message": _("Transaction not found in Wallee")
 		}
 
+	current_span().set_transaction(doc.transaction_id)
+
 	try:
 		# Use get_full_transaction to get the complete Transaction object
 		# (not get_transaction_status which returns a dict)
 		wallee_tx = get_full_transaction(doc.transaction_id)
-		update_transaction_from_wallee(doc, wallee_tx)
+		with span("db save Wallee Transaction", transaction_id=doc.transaction_id):
+			update_transaction_from_wallee(doc, wallee_tx)
 		doc.reload()
 
-		# For terminal payments, "Authorized" means the payment was successful
-		# (the card was charged). It will transition to Completed/Fulfill automatically.
-		# We treat Authorized as completed for the POS flow.
-		completed_states = ["Completed", "Fulfill", "Authorized"]
-		failed_states = ["Failed", "Decline", "Voided"]
-
-		return {
-			"success": True,
-			"transaction_name": doc.name,
-			"transaction_id": doc.transaction_id,
-			"status": doc.status,
-			"wallee_state": str(wallee_tx.state.value) if wallee_tx.state else None,
-			"amount": doc.amount,
-			"currency": doc.currency,
-			"completed": doc.status in completed_states,
-			"failed": doc.status in failed_states,
-			"failure_reason": doc.failure_reason
-		}
+		return get_transaction_status_payload(
+			doc, str(wallee_tx.state.value) if wallee_tx.state else None
+		)
 	except Exception as e:
 		frappe.log_error("Terminal Status Check Error", f"Transaction: {transaction_name}, Error: {str(e)}")
-		completed_states = ["Completed", "Fulfill", "Authorized"]
-		failed_states = ["Failed", "Decline", "Voided"]
 		return {
 			"success": False,
 			"status": doc.status,
-			"completed": doc.status in completed_states,
-			"failed": doc.status in failed_states,
+			"completed": doc.status in COMPLETED_STATUSES,
+			"failed": doc.status in FAILED_STATUSES,
 			"message": str(e)
 		}
 
 
 @frappe.whitelist()
+@traced()
+def get_terminal_payment_status(transaction_name):
+	"""
+	Get the status of a terminal payment for POS polling
+
+	Answers from the status cache kept up to date by webhooks and the sync
+	job, and only reads from Wallee (see check_terminal_payment_status) when
+	the cached status is older than Status Cache Max Age.
+
+	Args:
+		transaction_name: Local transaction name
+
+	Returns:
+		Current payment status
+	"""
+	from wallee_integration.wallee_integration.doctype.wallee_transaction.wallee_transaction import (
+		get_cached_transaction_status
+	)
+
+	status = get_cached_transaction_status(transaction_name)
+	current_span().set_attribute("cache.hit", bool(status))
+
+	if status:
+		# A finished payment does not change anymore for the POS flow
+		finished = status.get("completed") or status.get("failed")
+		age = time.time() - status.get("cached_at", 0)
+
+		if finished or age <= flt(get_settings().status_cache_max_age):
+			return status
+
+	return check_terminal_payment_status(transaction_name)
+
+
+@frappe.whitelist()
+@traced()
 def cancel_terminal_payment(transaction_name):
 	"""
 	Cancel a pending terminal payment
@@ -235,6 +274,7 @@ def cancel_terminal_payment(transaction_name):
 	from wallee_integration.wallee_integration.api.transaction import void_transaction, get_full_transaction
 
 	doc = frappe.get_doc("Wallee Transaction", transaction_name)
+	current_span().set_transaction(doc.transaction_id)
 
 	# Allow cancelling if local status is cancellable OR if already voided (for idempotency)
 	if doc.status not in ["Pending", "Processing", "Authorized", "Confirmed", "Voided", "Failed"]:
@@ -408,13 +448,14 @@ def get_till_connection_credentials(transaction_name):
 		frappe.throw(_("Could not determine terminal ID for this transaction"))
 
 	# Get credentials from Wallee API
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# Get till connection credentials (returns a token string)
-		token = service.get_payment_terminals_id_till_connection_credentials(
+		token = call_api(
+			"payment-terminals/{id}/till-connection-credentials",
+			service.get_payment_terminals_id_till_connection_credentials,
 			int(terminal_id),
 			int(doc.transaction_id),
 			space_id
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+Threshold-triggered profiling of slow Wallee requests and jobs.
+
+With a Profiling Threshold set in Wallee Settings, every whitelisted method
+and background or scheduled job of this app is watched from the
+before_request / before_job hooks. Calls that run longer than the threshold
+are saved as a Wallee Profile Record with their top frames:
+
+- Sampling: a watcher thread wakes up once the threshold has passed and
+  samples the call's stack every SAMPLE_INTERVAL seconds until it ends, so
+  calls faster than the threshold only pay for starting the watcher
+- cProfile: the whole call is profiled and the statistics are kept only if
+  it was slow; exact call counts, at a noticeable cost on every call
+
+Without a threshold the hooks return after checking the method name and
+the cached settings.
+"""
+
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+import frappe
+from frappe.utils import flt
+
+
+PROFILE_DOCTYPE = "Wallee Profile Record"
+
+APP_PREFIX = "wallee_integration."
+
+# Seconds between two stack samples of a slow call
+SAMPLE_INTERVAL = 0.01
+
+# Innermost frames kept per stack sample
+MAX_STACK_DEPTH = 40
+
+# Frames listed in a profile record
+TOP_FRAMES = 30
+
+SCHEDULED_JOB_METHOD = "frappe.core.doctype.scheduled_job_type.scheduled_job_type.run_scheduled_job"
+
+
+class _StackSampler(threading.Thread):
+	"""Samples the stack of one thread once ``delay`` seconds have passed."""
+
+	def __init__(self, thread_id, delay):
+		super().__init__(name="wallee-profiler", daemon=True)
+		self.thread_id = thread_id
+		self.delay = delay
+		self.samples = Counter()
+		self.finished = threading.Event()
+
+	def run(self):
+		if self.finished.wait(self.delay):
+			return
+
+		while not self.finished.is_set():
+			frame = sys._current_frames().get(self.thread_id)
+			if frame is None:
+				return
+
+			self.samples[_stack(frame)] += 1
+			del frame
+			self.finished.wait(SAMPLE_INTERVAL)
+
+	def stop(self):
+		self.finished.set()
+		self.join()
+
+
+def start_request_profiling():
+	"""before_request hook: watch whitelisted methods of this app."""
+	request = getattr(frappe.local, "request", None)
+	path = request.path if request else ""
+	method = path.rsplit("/method/", 1)[-1].strip("/") if "/method/" in path else frappe.form_dict.get("cmd")
+
+	_start(method, "Request")
+
+
+def start_job_profiling(method=None, kwargs=None):
+	"""before_job hook: watch background and scheduled jobs of this app."""
+	if method == SCHEDULED_JOB_METHOD:
+		method = (kwargs or {}).get("job_type")
+
+	_start(method, "Job")
+
+
+def stop_profiling():
+	"""
+	after_request / after_job hook: save the profile of a slow call.
+
+	Must run before flush_spans, which resets the trace the record links to.
+	"""
+	profile = getattr(frappe.local, "wallee_profile", None)
+	if not profile:
+		return
+
+	frappe.local.wallee_profile = None
+	duration = time.monotonic() - profile["start"]
+
+	if profile["profiler"]:
+		profile["profiler"].disable()
+	else:
+		profile["sampler"].stop()
+
+	if duration < profile["threshold"]:
+		return
+
+	try:
+		if profile["profiler"]:
+			samples, top_frames = 0, _format_profile(profile["profiler"])
+		else:
+			samples, top_frames = _format_samples(profile["sampler"].samples, profile["threshold"])
+
+		frappe.get_doc({
+			"doctype": PROFILE_DOCTYPE,
+			"method": profile["method"],
+			"kind": profile["kind"],
+			"profiler": profile["mode"],
+			"duration": round(duration, 3),
+			"threshold": profile["threshold"],
+			"samples": samples,
+			"user": frappe.session.user if getattr(frappe.local, "session", None) else None,
+			"trace_id": _get_trace_id(),
+			"top_frames": top_frames,
+		}).insert(ignore_permissions=True)
+		frappe.db.commit()
+	except Exception:
+		frappe.logger("wallee_integration").exception(
+			"Dropped Wallee profile of {0} ({1:.1f}s)".format(profile["method"], duration)
+		)
+
+
+def _start(method, kind):
+	frappe.local.wallee_profile = None
+
+	if not method or not method.startswith(APP_PREFIX):
+		return
+
+	from wallee_integration.wallee_integration.api.client import get_settings
+
+	settings = get_settings()
+	threshold = flt(settings.get("profiling_threshold"))
+	if threshold <= 0:
+		return
+
+	mode = settings.get("profiling_mode") or "Sampling"
+	profile = {
+		"method": method,
+		"kind": kind,
+		"mode": mode,
+		"threshold": threshold,
+		"profiler": None,
+		"sampler": None,
+	}
+
+	if mode == "cProfile":
+		profiler = cProfile.Profile()
+		try:
+			profiler.enable()
+		except ValueError:
+			# Another profiler (e.g. the Frappe recorder) is active on this thread
+			return
+		profile["profiler"] = profiler
+	else:
+		profile["sampler"] = _StackSampler(threading.get_ident(), threshold)
+		profile["sampler"].start()
+
+	profile["start"] = time.monotonic()
+	frappe.local.wallee_profile = profile
+
+
+def _stack(frame):
+	"""Stack of a frame as a tuple of "file:line in function", outermost first."""
+	# Without source lines: sampling must not read files
+	summary = traceback.StackSummary.extract(
+		traceback.walk_stack(frame), limit=MAX_STACK_DEPTH, lookup_lines=False
+	)
+	return tuple(
+		"{0}:{1} in {2}".format(_short_path(entry.filename), entry.lineno, entry.name)
+		for entry in reversed(summary)
+	)
+
+
+def _short_path(filename):
+	for marker in ("/site-packages/", "/apps/"):
+		if marker in filename:
+			return filename.rsplit(marker, 1)[-1]
+	return filename
+
+
+def _format_samples(samples, threshold):
+	"""Render stack samples as the hottest stack and the frames seen most often."""
+	total = sum(samples.values())
+	if not total:
+		return 0, "No samples taken: the call ended right after the threshold."
+
+	own = Counter()
+	inclusive = Counter()
+	for stack, count in samples.items():
+		own[stack[-1]] += count
+		for entry in set(stack):
+			inclusive[entry] += count
+
+	hottest, hottest_count = samples.most_common(1)[0]
+
+	lines = [
+		"{0} samples every {1:g} ms, taken after the first {2:g} s".format(total, SAMPLE_INTERVAL * 1000, threshold),
+		"",
+		"Hottest stack ({0} samples, innermost last):".format(hottest_count),
+	]
+	lines.extend("  " + entry for entry in hottest)
+	lines.extend(["", "{0:>6} {1:>6}  Frame (own and total share of samples)".format("Own", "Total")])
+
+	for entry, count in inclusive.most_common(TOP_FRAMES):
+		lines.append("{0:>6.0%} {1:>6.0%}  {2}".format(own[entry] / total, count / total, entry))
+
+	return total, "\n".join(lines)
+
+
+def _format_profile(profiler):
+	stream = io.StringIO()
+	stats = pstats.Stats(profiler, stream=stream)
+	stats.sort_stats("cumulative").print_stats(TOP_FRAMES)
+	return stream.getvalue().strip()
+
+
+def _get_trace_id():
+	"""Trace of the profiled call, while tracing is on (see api.tracing)."""
+	state = getattr(frappe.local, "wallee_tracing", None)
+	if not state or not state["finished"]:
+		return None
+
+	return state["finished"][-1].trace_id
@@ -5,11 +5,15 @@
 import frappe
 from frappe import _
 from wallee_integration.wallee_integration.api.client import (
-	get_wallee_client,
+	call_api,
+	get_service,
 	get_space_id,
 	log_api_call
 )
 
+# Maximum number of refunds requested per search call
+REFUND_PAGE_SIZE = 100
+
 
 @frappe.whitelist()
 def create_refund(transaction_id, amount, reason=None, external_id=None):
@@ -28,9 +32,8 @@ def create_refund(transaction_id, amount, reason=None, external_id=None):
 	from wallee.service.refunds_service import RefundsService
 	from wallee.models import RefundCreate
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = RefundsService(config)
+	service = get_service(RefundsService)
 
 	refund_create = RefundCreate(
 		transaction=transaction_id,
@@ -40,16 +43,16 @@ def create_refund(transaction_id, amount, reason=None, external_id=None):
 	)
 
 	try:
-		response = service.refund(space_id, refund_create)
+		response = call_api("refunds", service.refund, space_id, refund_create)
 		response_dict = response.to_dict() if hasattr(response, "to_dict") else {}
-		log_api_call("POST", "refunds", refund_create.to_dict(), response_dict)
+		log_api_call("POST", "refunds", refund_create, response_dict)
 
 		# Update local transaction record with new refund fields
 		update_transaction_after_refund(transaction_id, response, reason)
 
 		return response_dict
 	except Exception as e:
-		log_api_call("POST", "refunds", refund_create.to_dict(), error=e)
+		log_api_call("POST", "refunds", refund_create, error=e)
 		frappe.throw(_("Failed to create refund: {0}").format(str(e)))
 
 
@@ -57,13 +60,12 @@ def get_refund_status(refund_id):
 	"""Get refund status from Wallee"""
 	from wallee.service.refunds_service import RefundsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = RefundsService(config)
+	service = get_service(RefundsService)
 
 	try:
-		response = service.read(space_id, refund_id)
-		log_api_call("GET", f"refunds/{refund_id}", response_data=response.to_dict())
+		response = call_api("refunds/{id}", service.read, space_id, refund_id)
+		log_api_call("GET", f"refunds/{refund_id}", response_data=response)
 		return {
 			"id": response.id,
 			"state": response.state.value if response.state else None,
@@ -76,34 +78,109 @@ def get_refund_status(refund_id):
 
 
 def search_refunds(transaction_id=None, page=0, size=20):
-	"""Search refunds with filters"""
+	"""
+	Search refunds with filters - returns one page of refunds
+
+	Use iter_refunds to go through every matching refund.
+	"""
 	from wallee.service.refunds_service import RefundsService
-	from wallee.models import EntityQuery, EntityQueryFilter, EntityQueryFilterType
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = RefundsService(config)
+	service = get_service(RefundsService)
 
-	query = EntityQuery(
-		number_of_entities=size,
-		start_position=page * size
+	query = _build_refund_query(transaction_id, size)
+	query.start_position = page * size
+
+	try:
+		response = call_api("refunds/search", service.search, space_id, query)
+		log_api_call("POST", "refunds/search", query, {"count": len(response)})
+		return response
+	except Exception as e:
+		log_api_call("POST", "refunds/search", query, error=e)
+		raise
+
+
+def iter_refunds(transaction_id=None, filters=None, page_size=None):
+	"""
+	Iterate over all matching refunds, one at a time.
+
+	Pages are requested lazily and read by ID (each page starts after the
+	last ID of the previous one), so memory use does not grow with the number
+	of refunds and deep pages stay as fast as the first.
+
+	Args:
+		transaction_id: Only refunds of this Wallee transaction
+		filters: Additional EntityQueryFilter leaves, e.g. on "state"
+		page_size: Number of refunds per search call (default REFUND_PAGE_SIZE)
+
+	Yields:
+		Refund objects in ID order
+	"""
+	from wallee.service.refunds_service import RefundsService
+
+	space_id = get_space_id()
+	service = get_service(RefundsService)
+
+	page_size = page_size or REFUND_PAGE_SIZE
+	last_id = None
+
+	while True:
+		query = _build_refund_query(transaction_id, page_size, filters=filters, after_id=last_id)
+
+		try:
+			refunds = call_api("refunds/search", service.search, space_id, query) or []
+			log_api_call("POST", "refunds/search", query, {"count": len(refunds)})
+		except Exception as e:
+			log_api_call("POST", "refunds/search", query, error=e)
+			raise
+
+		yield from refunds
+
+		if len(refunds) < page_size:
+			break
+
+		last_id = refunds[-1].id
+
+
+def _build_refund_query(transaction_id=None, size=20, filters=None, after_id=None):
+	"""Build the EntityQuery for a refund search, ordered by ID."""
+	from wallee.models import (
+		EntityQuery,
+		EntityQueryFilter,
+		EntityQueryFilterType,
+		EntityQueryOrderBy,
+		EntityQueryOrderByType
 	)
 
+	leaves = list(filters or [])
+
 	if transaction_id:
-		query.filter = EntityQueryFilter(
+		leaves.append(EntityQueryFilter(
 			type=EntityQueryFilterType.LEAF,
 			field_name="transaction",
 			operator="EQUALS",
 			value=transaction_id
-		)
+		))
 
-	try:
-		response = service.search(space_id, query)
-		log_api_call("POST", "refunds/search", query.to_dict(), [r.to_dict() for r in response])
-		return response
-	except Exception as e:
-		log_api_call("POST", "refunds/search", query.to_dict(), error=e)
-		raise
+	if after_id:
+		leaves.append(EntityQueryFilter(
+			type=EntityQueryFilterType.LEAF,
+			field_name="id",
+			operator="GREATER_THAN",
+			value=after_id
+		))
+
+	query = EntityQuery(
+		number_of_entities=size,
+		order_bys=[EntityQueryOrderBy(field_name="id", sorting=EntityQueryOrderByType.ASC)]
+	)
+
+	if len(leaves) == 1:
+		query.filter = leaves[0]
+	elif leaves:
+		query.filter = EntityQueryFilter(type=EntityQueryFilterType.AND, children=leaves)
+
+	return query
 
 
 def update_transaction_after_refund(transaction_id, refund_response, reason=None):
@@ -6,7 +6,10 @@ import frappe
 from frappe import _
 import uuid
 from wallee_integration.wallee_integration.api.client import (
-	get_wallee_client,
+	call_api,
+	clear_settings_cache,
+	get_service,
+	get_settings,
 	get_space_id,
 	log_api_call
 )
@@ -26,7 +29,7 @@ def get_wallee_terminal_settings():
 	Returns:
 		dict with configuration_version, location_version, and terminal_type_id
 	"""
-	settings = frappe.get_single("Wallee Settings")
+	settings = get_settings()
 	return {
 		"configuration_version": settings.get("terminal_configuration_version"),
 		"location_version": settings.get("terminal_location_version"),
@@ -75,15 +78,14 @@ def get_terminals():
 	"""Get all payment terminals from Wallee (SDK 6.3.0+)"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# SDK 6.3.0: get_payment_terminals returns TerminalListResponse with .data property
-		response = service.get_payment_terminals(space_id)
+		response = call_api("payment-terminals", service.get_payment_terminals, space_id)
 		terminals = response.data if response.data else []
-		log_api_call("GET", "payment-terminals", response_data=[t.to_dict() for t in terminals])
+		log_api_call("GET", "payment-terminals", response_data={"count": len(terminals)})
 		return terminals
 	except Exception as e:
 		log_api_call("GET", "payment-terminals", error=e)
@@ -94,14 +96,18 @@ def get_terminal_details(terminal_id):
 	"""Get details of a specific terminal"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# SDK 6.3.0: Use get_payment_terminals_id instead of read
-		response = service.get_payment_terminals_id(int(terminal_id), space_id)
-		log_api_call("GET", f"payment-terminals/{terminal_id}", response_data=response.to_dict())
+		response = call_api(
+			"payment-terminals/{id}",
+			service.get_payment_terminals_id,
+			int(terminal_id),
+			space_id
+		)
+		log_api_call("GET", f"payment-terminals/{terminal_id}", response_data=response)
 		return {
 			"id": response.id,
 			"identifier": response.identifier,
@@ -163,9 +169,8 @@ def create_terminal(name, terminal_type_id, configuration_version=None, location
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 	from wallee.models import PaymentTerminalCreate
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	terminal_create = PaymentTerminalCreate(
 		name=name,
@@ -176,7 +181,13 @@ def create_terminal(name, terminal_type_id, configuration_version=None, location
 	)
 
 	try:
-		response = service.post_payment_terminals(space=space_id, payment_terminal_create=terminal_create)
+		response = call_api(
+			"payment-terminals",
+			service.post_payment_terminals,
+			space=space_id,
+			payment_terminal_create=terminal_create,
+			idempotent=False
+		)
 		result = {
 			"id": response.id,
 			"name": response.name,
@@ -211,16 +222,18 @@ def link_terminal_device(terminal_id, serial_number):
 	"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# Link returns 204 No Content, so we fetch the terminal after linking
-		service.post_payment_terminals_id_link(
+		call_api(
+			"payment-terminals/{id}/link",
+			service.post_payment_terminals_id_link,
 			id=int(terminal_id),
 			serial_number=serial_number,
-			space=space_id
+			space=space_id,
+			idempotent=False
 		)
 		log_api_call(
 			"POST",
@@ -253,15 +266,17 @@ def unlink_terminal_device(terminal_id):
 	"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# Unlink returns 204 No Content, so we fetch the terminal after unlinking
-		service.post_payment_terminals_id_unlink(
+		call_api(
+			"payment-terminals/{id}/unlink",
+			service.post_payment_terminals_id_unlink,
 			id=int(terminal_id),
-			space=space_id
+			space=space_id,
+			idempotent=False
 		)
 		log_api_call(
 			"POST",
@@ -275,29 +290,34 @@ def unlink_terminal_device(terminal_id):
 		raise
 
 
-def initiate_terminal_transaction(terminal_id, transaction_id):
+def initiate_terminal_transaction(terminal_id, transaction_id, priority="interactive"):
 	"""
 	Initiate a payment on a terminal
 
 	Args:
 		terminal_id: Wallee Terminal ID
 		transaction_id: Wallee Transaction ID to process
+		priority: Rate limit priority, interactive as a customer waits at the
+			terminal even though this runs in a background job
 
 	Returns:
 		Terminal transaction result
 	"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# SDK 6.3.0: Use post_payment_terminals_id_perform_transaction
-		response = service.post_payment_terminals_id_perform_transaction(
+		response = call_api(
+			"payment-terminals/{id}/perform-transaction",
+			service.post_payment_terminals_id_perform_transaction,
 			int(terminal_id),
 			int(transaction_id),
-			space_id
+			space_id,
+			idempotent=False,
+			priority=priority
 		)
 		log_api_call(
 			"POST",
@@ -320,15 +340,17 @@ def trigger_terminal_balance(terminal_id):
 	"""Trigger final balance/settlement on a terminal"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# SDK 6.3.0: Use post_payment_terminals_id_trigger_final_balance
-		response = service.post_payment_terminals_id_trigger_final_balance(
+		response = call_api(
+			"payment-terminals/{id}/trigger-final-balance",
+			service.post_payment_terminals_id_trigger_final_balance,
 			int(terminal_id),
-			space_id
+			space_id,
+			idempotent=False
 		)
 		log_api_call(
 			"POST",
@@ -345,13 +367,14 @@ def get_terminal_credentials(terminal_id):
 	"""Get terminal connection credentials (for direct integration)"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
 		# SDK 6.3.0: Use get_payment_terminals_id_till_connection_credentials
-		response = service.get_payment_terminals_id_till_connection_credentials(
+		response = call_api(
+			"payment-terminals/{id}/till-connection-credentials",
+			service.get_payment_terminals_id_till_connection_credentials,
 			int(terminal_id),
 			space_id
 		)
@@ -465,12 +488,13 @@ def delete_terminal(terminal_id):
 	"""
 	from wallee.service.payment_terminals_service import PaymentTerminalsService
 
-	config = get_wallee_client()
 	space_id = get_space_id()
-	service = PaymentTerminalsService(config)
+	service = get_service(PaymentTerminalsService)
 
 	try:
-		service.delete_payment_terminals_id(
+		call_api(
+			"payment-terminals/{id}",
+			service.delete_payment_terminals_id,
 			id=int(terminal_id),
 			space=space_id
 		)
@@ -538,7 +562,7 @@ def reset_wallee_data(include_transactions=True, include_payment_gateway=True):
 
 	# 0. Delete Application Users from Wallee API (before credentials are cleared)
 	try:
-		settings = frappe.get_single("Wallee Settings")
+		settings = get_settings()
 		if settings.user_id and settings.authentication_key:
 			from wallee import Configuration, ApplicationUsersService
 
@@ -665,6 +689,7 @@ def reset_wallee_data(include_transactions=True, include_payment_gateway=True):
 		]
 		for field in fields_to_reset:
 			frappe.db.set_single_value("Wallee Settings", field, None)
+		clear_settings_cache()
 		report["erpnext"]["Wallee Settings"] = "full reset (credentials + settings)"
 	except Exception as e:
 		report["errors"].append({"type": "wallee_settings", "error": str(e)})
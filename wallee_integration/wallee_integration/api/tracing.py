@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+"""
+Lightweight tracing of Wallee calls, DB saves and background jobs.
+
+Spans follow the OpenTelemetry data model (W3C trace and span IDs, OTLP/JSON
+export) without depending on the OpenTelemetry SDK. Tracing is off by
+default and ``span`` then returns a shared no-op span; with an exporter
+selected in Wallee Settings, the spans of a request or job are buffered and
+exported when it ends:
+
+- File: one JSON span per line in ``<site>/logs/wallee_traces.jsonl``
+- OTLP: POSTed to ``<OTLP Endpoint>/v1/traces`` (OTLP/HTTP with JSON)
+
+Jobs enqueued inside a span receive its context (see ``get_trace_context``)
+and continue the same trace when decorated with ``traced``, recording how
+long they waited in the queue. Spans about one payment carry the
+``wallee.transaction_id`` attribute.
+"""
+
+import functools
+import inspect
+import json
+import os
+import secrets
+import time
+import urllib.request
+from contextlib import contextmanager
+
+import frappe
+
+
+TRACE_FILE = "wallee_traces.jsonl"
+
+SERVICE_NAME = "wallee_integration"
+
+# Seconds to wait for the OTLP collector before dropping a batch
+OTLP_TIMEOUT = 2
+
+TRANSACTION_ATTRIBUTE = "wallee.transaction_id"
+
+
+class Span:
+	"""A timed operation. Use through ``span``."""
+
+	def __init__(self, name, trace_id, parent_id=None, attributes=None):
+		self.name = name
+		self.trace_id = trace_id
+		self.span_id = secrets.token_hex(8)
+		self.parent_id = parent_id
+		self.attributes = dict(attributes or {})
+		self.start_ns = time.time_ns()
+		self.end_ns = None
+		self.error = None
+
+	def set_attribute(self, key, value):
+		if value is not None:
+			self.attributes[key] = value
+
+	def set_transaction(self, transaction_id):
+		self.set_attribute(TRANSACTION_ATTRIBUTE, str(transaction_id) if transaction_id else None)
+
+	@property
+	def traceparent(self):
+		return f"00-{self.trace_id}-{self.span_id}-01"
+
+	def to_dict(self):
+		return {
+			"traceId": self.trace_id,
+			"spanId": self.span_id,
+			"parentSpanId": self.parent_id or "",
+			"name": self.name,
+			"kind": 1,
+			"startTimeUnixNano": str(self.start_ns),
+			"endTimeUnixNano": str(self.end_ns),
+			"attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+			"status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+		}
+
+
+class _NoopSpan:
+	"""Returned while tracing is off, so callers never need to check."""
+
+	traceparent = None
+
+	def set_attribute(self, key, value):
+		pass
+
+	def set_transaction(self, transaction_id):
+		pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name, transaction_id=None, trace_context=None, **attributes):
+	"""
+	Trace the enclosed block as a child of the current span.
+
+	Args:
+		name: Span name, e.g. "wallee payment/transactions/{id}"
+		transaction_id: Wallee transaction ID, set as ``wallee.transaction_id``
+		trace_context: Context from get_trace_context, for a job continuing
+			the trace of the request that enqueued it
+		**attributes: Span attributes
+
+	Yields:
+		Span, or a no-op span while tracing is off
+	"""
+	state = _get_state()
+	if state is None:
+		yield NOOP_SPAN
+		return
+
+	stack = state["stack"]
+	if stack:
+		trace_id, parent_id = stack[-1].trace_id, stack[-1].span_id
+	else:
+		trace_id, parent_id = _parse_context(trace_context) or (secrets.token_hex(16), None)
+
+	current = Span(name, trace_id, parent_id, attributes)
+	current.set_transaction(transaction_id)
+	if trace_context and trace_context.get("enqueued_at") and not stack:
+		current.set_attribute("queue.wait_ms", round((time.time() - trace_context["enqueued_at"]) * 1000, 1))
+
+	stack.append(current)
+	try:
+		yield current
+	except Exception as e:
+		current.error = f"{type(e).__name__}: {e}"[:500]
+		raise
+	finally:
+		current.end_ns = time.time_ns()
+		stack.pop()
+		state["finished"].append(current)
+
+
+def traced(name=None):
+	"""
+	Run the decorated function in a span, for whitelisted methods and jobs.
+
+	Place it beneath ``@frappe.whitelist()``. A ``trace_context`` keyword
+	argument (see get_trace_context) is taken out of the call and continues
+	the enqueuing request's trace.
+	"""
+	def decorator(fn):
+		span_name = name or "{0}.{1}".format(fn.__module__.rsplit(".", 1)[-1], fn.__name__)
+
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			with span(span_name, trace_context=kwargs.pop("trace_context", None)):
+				return fn(*args, **kwargs)
+
+		# frappe maps request arguments by these names instead of the wrapper's signature
+		wrapper.fnargs = [
+			param.name for param in inspect.signature(fn).parameters.values()
+			if param.kind not in (param.VAR_POSITIONAL, param.VAR_KEYWORD)
+		]
+		return wrapper
+
+	return decorator
+
+
+def current_span():
+	"""The innermost open span, or a no-op span."""
+	state = _get_state()
+	if not state or not state["stack"]:
+		return NOOP_SPAN
+
+	return state["stack"][-1]
+
+
+def get_trace_context():
+	"""
+	Context of the current span to pass to an enqueued job, None while tracing is off.
+
+	Returns:
+		dict: {traceparent, enqueued_at}
+	"""
+	state = _get_state()
+	if not state or not state["stack"]:
+		return None
+
+	return {"traceparent": state["stack"][-1].traceparent, "enqueued_at": time.time()}
+
+
+def flush_spans():
+	"""Export the finished spans of the current request or job."""
+	state = getattr(frappe.local, "wallee_tracing", None)
+	frappe.local.wallee_tracing = None
+
+	if not state or not state["finished"]:
+		return
+
+	try:
+		if state["exporter"] == "OTLP":
+			_export_otlp(state["finished"], state["endpoint"])
+		else:
+			_export_file(state["finished"])
+	except Exception:
+		frappe.logger("wallee_integration").exception(
+			"Dropped {0} Wallee trace spans".format(len(state["finished"]))
+		)
+
+
+def _get_state():
+	"""Tracing state of the current request or job, None while tracing is off or without frappe context."""
+	if not getattr(frappe.local, "site", None):
+		return None
+
+	state = getattr(frappe.local, "wallee_tracing", None)
+	if state is None:
+		from wallee_integration.wallee_integration.api.client import get_settings
+
+		settings = get_settings()
+		exporter = settings.get("tracing_exporter")
+		state = frappe.local.wallee_tracing = {
+			"exporter": exporter,
+			"endpoint": settings.get("otlp_endpoint"),
+			"stack": [],
+			"finished": [],
+		} if exporter else False
+
+	return state or None
+
+
+def _parse_context(trace_context):
+	traceparent = (trace_context or {}).get("traceparent") or ""
+	parts = traceparent.split("-")
+	if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+		return None
+	return parts[1], parts[2]
+
+
+def _attribute(key, value):
+	if isinstance(value, bool):
+		return {"key": key, "value": {"boolValue": value}}
+	if isinstance(value, int):
+		return {"key": key, "value": {"intValue": str(value)}}
+	if isinstance(value, float):
+		return {"key": key, "value": {"doubleValue": value}}
+	return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _resource():
+	return {"attributes": [
+		_attribute("service.name", SERVICE_NAME),
+		_attribute("frappe.site", frappe.local.site),
+	]}
+
+
+def _export_file(spans):
+	path = frappe.get_site_path("logs", TRACE_FILE)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+
+	site = frappe.local.site
+	with open(path, "a") as f:
+		for finished in spans:
+			f.write(json.dumps(dict(finished.to_dict(), site=site), separators=(",", ":")) + "\n")
+
+
+def _export_otlp(spans, endpoint):
+	if not endpoint:
+		return
+
+	body = json.dumps({"resourceSpans": [{
+		"resource": _resource(),
+		"scopeSpans": [{
+			"scope": {"name": SERVICE_NAME},
+			"spans": [finished.to_dict() for finished in spans],
+		}],
+	}]}).encode()
+
+	request = urllib.request.Request(
+		endpoint.rstrip("/") + "/v1/traces",
+		data=body,
+		headers={"Content-Type": "application/json"},
+		method="POST"
+	)
+	with urllib.request.urlopen(request, timeout=OTLP_TIMEOUT):
+		pass
@@ -4,12 +4,22 @@
 
 import frappe
 from frappe import _
+from frappe.utils import cint
 from wallee_integration.wallee_integration.api.client import (
-    get_wallee_client,
+    CircuitBreaker,
+    call_api,
+    get_service,
     get_space_id,
     log_api_call
 )
 
+# Maximum number of entities requested per Wallee search call
+SEARCH_PAGE_SIZE = 100
+
+# Completions per transaction, kept briefly for repeated reads
+COMPLETIONS_CACHE_KEY = "wallee_transaction_completions"
+COMPLETIONS_CACHE_TTL = 300
+
 
 def create_transaction(amount=None, line_items=None, currency=None, **kwargs):
     """
@@ -33,9 +43,8 @@ def create_transaction(amount=None, line_items=None, currency=None, **kwargs):
     """
     from wallee import TransactionsService, LineItemCreate, TransactionCreate, LineItemType, AddressCreate, TaxCreate
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     # Build line items
     wallee_line_items = []
@@ -116,13 +125,24 @@ def create_transaction(amount=None, line_items=None, currency=None, **kwargs):
 
     try:
         # Create the transaction
-        response = service.post_payment_transactions(space_id, transaction_create)
-        log_api_call("POST", "payment/transactions", transaction_create.to_dict(), response.to_dict())
+        response = call_api(
+            "payment/transactions",
+            service.post_payment_transactions,
+            space_id,
+            transaction_create,
+            idempotent=False
+        )
+        log_api_call("POST", "payment/transactions", transaction_create, response)
 
         transaction_id = response.id
 
         # Get payment page URL (note: method signature is id, space - not space, id)
-        payment_url = service.get_payment_transactions_id_payment_page_url(transaction_id, space_id)
+        payment_url = call_api(
+            "payment/transactions/{id}/payment-page-url",
+            service.get_payment_transactions_id_payment_page_url,
+            transaction_id,
+            space_id
+        )
         log_api_call("GET", f"payment/transactions/{transaction_id}/payment-page-url", response_data=payment_url)
 
         return {
@@ -131,7 +151,7 @@ def create_transaction(amount=None, line_items=None, currency=None, **kwargs):
             "state": response.state.value if response.state else None
         }
     except Exception as e:
-        log_api_call("POST", "payment/transactions", transaction_create.to_dict() if transaction_create else {}, error=e)
+        log_api_call("POST", "payment/transactions", transaction_create, error=e)
         raise
 
 
@@ -147,14 +167,18 @@ def get_transaction_status(transaction_id):
     """
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
-        response = service.get_payment_transactions_id(transaction_id, space_id)
-        log_api_call("GET", f"payment/transactions/{transaction_id}", response_data=response.to_dict())
+        response = call_api(
+            "payment/transactions/{id}",
+            service.get_payment_transactions_id,
+            transaction_id,
+            space_id
+        )
+        log_api_call("GET", f"payment/transactions/{transaction_id}", response_data=response)
         return {
             "id": response.id,
             "state": response.state.value if response.state else None,
@@ -169,25 +193,31 @@ def get_transaction_status(transaction_id):
         raise
 
 
-def get_full_transaction(transaction_id):
+def get_full_transaction(transaction_id, priority=None):
     """
     Get full transaction data from Wallee including line items, fees, etc.
 
     Args:
         transaction_id: Wallee transaction ID
+        priority: Rate limit priority (default: see get_call_priority)
 
     Returns:
         Transaction: Complete transaction object (not dict - SDK to_dict() truncates data)
     """
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
-        response = service.get_payment_transactions_id(int(transaction_id), space_id)
+        response = call_api(
+            "payment/transactions/{id}",
+            service.get_payment_transactions_id,
+            int(transaction_id),
+            space_id,
+            priority=priority
+        )
         log_api_call("GET", f"payment/transactions/{transaction_id}/full", response_data={"state": str(response.state)})
 
         # Return the full response object directly (NOT to_dict() which truncates data)
@@ -197,18 +227,219 @@ def get_full_transaction(transaction_id):
         raise
 
 
+def fetch_transactions_in_bulk(transaction_ids, page_size=None, max_workers=8):
+    """
+    Fetch many full transactions from Wallee, one search call per page of IDs.
+
+    Pages are requested over a bounded thread pool. Results are yielded on the
+    caller's thread, so any DB writes made while consuming them stay on the
+    caller's own connection.
+
+    Args:
+        transaction_ids: Iterable of Wallee transaction IDs
+        page_size: Number of IDs per search call (default SEARCH_PAGE_SIZE)
+        max_workers: Maximum number of concurrent requests
+
+    Yields:
+        tuple: (transaction_id, Transaction or None, Exception or None)
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from wallee import TransactionsService
+
+    space_id = get_space_id()
+    service = get_service(TransactionsService)
+    # Resolved here: worker threads have no frappe context
+    breaker = CircuitBreaker()
+
+    page_size = page_size or SEARCH_PAGE_SIZE
+    transaction_ids = [str(tid) for tid in transaction_ids]
+    pages = [
+        transaction_ids[i:i + page_size]
+        for i in range(0, len(transaction_ids), page_size)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers or 1))) as executor:
+        futures = {
+            executor.submit(_search_transactions_by_ids, service, space_id, page, breaker): page
+            for page in pages
+        }
+
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                found = {str(tx.id): tx for tx in future.result()}
+            except Exception as e:
+                log_api_call("GET", "payment/transactions/search", {"ids": page}, error=e)
+                for transaction_id in page:
+                    yield transaction_id, None, e
+                continue
+
+            log_api_call("GET", "payment/transactions/search", {"ids": page}, {"count": len(found)})
+
+            for transaction_id in page:
+                if transaction_id in found:
+                    yield transaction_id, found[transaction_id], None
+                else:
+                    yield transaction_id, None, frappe.DoesNotExistError(
+                        _("Transaction {0} not found in Wallee").format(transaction_id)
+                    )
+
+
+def iter_transactions(query=None, page_size=None):
+    """
+    Iterate over all transactions matching a search query, one at a time.
+
+    Pages are requested lazily, so memory use does not grow with the number
+    of matching transactions.
+
+    Args:
+        query: Wallee search query, or dict of filters (see build_search_query)
+        page_size: Number of transactions per search call (default SEARCH_PAGE_SIZE)
+
+    Yields:
+        Transaction objects in ID order
+    """
+    for transactions in iter_transaction_pages(query, page_size):
+        yield from transactions
+
+
+def iter_transaction_pages(query=None, page_size=None):
+    """
+    Iterate over the transactions matching a search query, page by page.
+
+    Pages are read by ID (each page starts after the last ID of the previous
+    one), so deep pages stay as fast as the first and a transaction created
+    during the iteration does not shift the following pages.
+
+    Args:
+        query: Wallee search query, or dict of filters (see build_search_query)
+        page_size: Number of transactions per search call (default SEARCH_PAGE_SIZE)
+
+    Yields:
+        list: One page of Transaction objects, in ID order
+    """
+    from wallee import TransactionsService
+
+    space_id = get_space_id()
+    service = get_service(TransactionsService)
+
+    page_size = page_size or SEARCH_PAGE_SIZE
+    query = build_search_query(query)
+    last_id = None
+
+    while True:
+        page_query = " AND ".join(
+            term for term in (query, f"id:>{last_id}" if last_id else None) if term
+        )
+        request_data = {"query": page_query, "limit": page_size}
+        try:
+            response = call_api(
+                "payment/transactions/search",
+                service.get_payment_transactions_search,
+                space_id,
+                query=page_query or None,
+                limit=page_size,
+                order="id ASC"
+            )
+            transactions = _get_response_items(response)
+            log_api_call("GET", "payment/transactions/search", request_data, {"count": len(transactions)})
+        except Exception as e:
+            log_api_call("GET", "payment/transactions/search", request_data, error=e)
+            raise
+
+        if transactions:
+            yield transactions
+
+        if len(transactions) < page_size:
+            break
+
+        last_id = transactions[-1].id
+
+
+def iter_transactions_changed_since(since, page_size=None):
+    """
+    Iterate over transactions whose state changed on Wallee since a point in time.
+
+    Args:
+        since: UTC datetime (or ISO 8601 string) to search from, inclusive
+        page_size: Number of transactions per search call (default SEARCH_PAGE_SIZE)
+
+    Yields:
+        list: One page of Transaction objects
+    """
+    if hasattr(since, "strftime"):
+        since = since.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    yield from iter_transaction_pages(f"stateChangedOn:>={since}", page_size)
+
+
+def build_search_query(filters=None):
+    """
+    Build a Wallee search query from filters.
+
+    Args:
+        filters: Query string (returned as is) or dict of Wallee field name to
+            value; a list value matches any of its items, e.g.
+            ``{"state": ["AUTHORIZED", "FULFILL"], "merchantReference": "SO-0001"}``
+
+    Returns:
+        str: Search query, or None without filters
+    """
+    if not filters:
+        return None
+
+    if isinstance(filters, str):
+        return filters
+
+    terms = []
+    for field, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            terms.append("{0}:({1})".format(field, " OR ".join(str(v) for v in value)))
+        else:
+            terms.append(f"{field}:{value}")
+
+    return " AND ".join(terms)
+
+
+def _search_transactions_by_ids(service, space_id, transaction_ids, breaker=None):
+    """Run one ID search. Does not touch the frappe context, so it is safe in worker threads."""
+    ids = [int(tid) for tid in transaction_ids]
+    query = "id:({0})".format(" OR ".join(str(tid) for tid in ids))
+    response = call_api(
+        "payment/transactions/search",
+        service.get_payment_transactions_search,
+        space_id,
+        query=query,
+        limit=len(ids),
+        breaker=breaker
+    )
+    return _get_response_items(response)
+
+
+def _get_response_items(response):
+    """Extract the entity list from a Wallee list/search response."""
+    if isinstance(response, list):
+        return response
+    return getattr(response, "data", None) or getattr(response, "items", None) or []
+
+
 def complete_transaction_online(transaction_id):
     """Complete an online transaction (capture)"""
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
-        response = service.post_payment_transactions_id_complete_online(transaction_id, space_id)
-        log_api_call("POST", f"payment/transactions/{transaction_id}/complete-online", response_data=response.to_dict())
+        response = call_api(
+            "payment/transactions/{id}/complete-online",
+            service.post_payment_transactions_id_complete_online,
+            transaction_id,
+            space_id,
+            idempotent=False
+        )
+        log_api_call("POST", f"payment/transactions/{transaction_id}/complete-online", response_data=response)
         return response
     except Exception as e:
         log_api_call("POST", f"payment/transactions/{transaction_id}/complete-online", error=e)
@@ -224,15 +455,20 @@ def void_transaction(transaction_id):
     """Void a pending or authorized transaction"""
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
         # transaction_id must be int for Wallee SDK
-        response = service.post_payment_transactions_id_void_online(int(transaction_id), space_id)
-        log_api_call("POST", f"payment/transactions/{transaction_id}/void", response_data=response.to_dict())
+        response = call_api(
+            "payment/transactions/{id}/void-online",
+            service.post_payment_transactions_id_void_online,
+            int(transaction_id),
+            space_id,
+            idempotent=False
+        )
+        log_api_call("POST", f"payment/transactions/{transaction_id}/void", response_data=response)
         return response
     except Exception as e:
         log_api_call("POST", f"payment/transactions/{transaction_id}/void", error=e)
@@ -243,13 +479,17 @@ def get_payment_page_url(transaction_id):
     """Get the payment page URL for a transaction (redirect mode)"""
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
-        response = service.get_payment_transactions_id_payment_page_url(transaction_id, space_id)
+        response = call_api(
+            "payment/transactions/{id}/payment-page-url",
+            service.get_payment_transactions_id_payment_page_url,
+            transaction_id,
+            space_id
+        )
         log_api_call("GET", f"payment/transactions/{transaction_id}/payment-page-url", response_data=response)
         return response
     except Exception as e:
@@ -261,13 +501,17 @@ def get_lightbox_javascript_url(transaction_id):
     """Get the Lightbox JavaScript URL for a transaction"""
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
-        response = service.get_payment_transactions_id_lightbox_javascript_url(transaction_id, space_id)
+        response = call_api(
+            "payment/transactions/{id}/lightbox-javascript-url",
+            service.get_payment_transactions_id_lightbox_javascript_url,
+            transaction_id,
+            space_id
+        )
         log_api_call("GET", f"payment/transactions/{transaction_id}/lightbox-javascript-url", response_data=response)
         return response
     except Exception as e:
@@ -279,13 +523,17 @@ def get_iframe_javascript_url(transaction_id):
     """Get the iFrame JavaScript URL for a transaction"""
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
         # Note: method signature is (id, space) not (space, id)
-        response = service.get_payment_transactions_id_iframe_javascript_url(transaction_id, space_id)
+        response = call_api(
+            "payment/transactions/{id}/iframe-javascript-url",
+            service.get_payment_transactions_id_iframe_javascript_url,
+            transaction_id,
+            space_id
+        )
         log_api_call("GET", f"payment/transactions/{transaction_id}/iframe-javascript-url", response_data=response)
         return response
     except Exception as e:
@@ -333,12 +581,13 @@ def get_payment_method_configurations(transaction_id, integration_mode="IFRAME")
     """
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
     try:
-        response = service.get_payment_transactions_id_payment_method_configurations(
+        response = call_api(
+            "payment/transactions/{id}/payment-method-configurations",
+            service.get_payment_transactions_id_payment_method_configurations,
             transaction_id,
             integration_mode,
             space_id
@@ -377,20 +626,43 @@ def get_payment_method_configurations(transaction_id, integration_mode="IFRAME")
 
 
 def search_transactions(filters=None, page=0, size=20):
-    """Search transactions with filters - returns list of transactions"""
+    """
+    Search transactions with filters - returns one page of transactions
+
+    Args:
+        filters: Query string or dict of filters (see build_search_query)
+        page: Page number, starting at 0
+        size: Number of transactions per page
+
+    Returns:
+        list: Transaction objects, newest first
+
+    Use iter_transactions to go through every matching transaction.
+    """
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
+
+    size = cint(size) or 20
+    query = build_search_query(filters)
+    request_data = {"query": query, "offset": cint(page) * size, "limit": size}
 
     try:
-        # Use simple list endpoint with pagination
-        response = service.get_payment_transactions(space_id)
-        log_api_call("GET", "payment/transactions", {}, [t.to_dict() for t in response] if response else [])
-        return response
+        response = call_api(
+            "payment/transactions/search",
+            service.get_payment_transactions_search,
+            space_id,
+            query=query,
+            limit=size,
+            offset=cint(page) * size,
+            order="id DESC"
+        )
+        transactions = _get_response_items(response)
+        log_api_call("GET", "payment/transactions/search", request_data, {"count": len(transactions)})
+        return transactions
     except Exception as e:
-        log_api_call("GET", "payment/transactions", {}, error=e)
+        log_api_call("GET", "payment/transactions/search", request_data, error=e)
         raise
 
 
@@ -400,11 +672,15 @@ def debug_transaction_attributes(transaction_id):
     """
     from wallee import TransactionsService
 
-    config = get_wallee_client()
     space_id = get_space_id()
-    service = TransactionsService(config)
+    service = get_service(TransactionsService)
 
-    tx = service.get_payment_transactions_id(int(transaction_id), space_id)
+    tx = call_api(
+        "payment/transactions/{id}",
+        service.get_payment_transactions_id,
+        int(transaction_id),
+        space_id
+    )
 
     attrs = {}
     for attr in sorted(dir(tx)):
@@ -423,36 +699,64 @@ def debug_transaction_attributes(transaction_id):
     return attrs
 
 
-def get_transaction_completions(transaction_id):
+def get_transaction_completions(transaction_id, use_cache=True):
     """
     Get completions for a transaction.
 
+    Searches the completions linked to the transaction page by page, a
+    transaction rarely has more than one page.
+
     Args:
         transaction_id: Wallee transaction ID
+        use_cache: Return the completions read in the last few minutes, if any
 
     Returns:
         list: List of completion objects
     """
     from wallee import TransactionCompletionService
 
-    config = get_wallee_client()
+    cache_key = f"{COMPLETIONS_CACHE_KEY}:{get_space_id()}:{transaction_id}"
+    if use_cache:
+        completions = frappe.cache().get_value(cache_key)
+        if completions is not None:
+            return completions
+
     space_id = get_space_id()
-    service = TransactionCompletionService(config)
+    service = get_service(TransactionCompletionService)
+    query = f"linkedTransaction:{int(transaction_id)}"
+
+    completions = []
+    offset = 0
 
     try:
-        # Get completions for transaction
-        response = service.get_payment_transaction_completion(space_id)
-        # Filter by transaction_id
-        completions = [c for c in response if c.line_item_version and
-                       c.line_item_version.transaction and
-                       c.line_item_version.transaction.id == int(transaction_id)]
+        while True:
+            response = call_api(
+                "payment/transaction-completion/search",
+                service.get_payment_transaction_completion_search,
+                space_id, query=query, limit=SEARCH_PAGE_SIZE, offset=offset, order="createdOn ASC"
+            )
+            page = _get_response_items(response)
+            completions.extend(page)
+
+            if len(page) < SEARCH_PAGE_SIZE:
+                break
+
+            offset += SEARCH_PAGE_SIZE
+
         log_api_call(
             "GET",
-            f"payment/transaction-completion",
-            {"transaction_id": transaction_id},
-            [c.to_dict() for c in completions]
+            "payment/transaction-completion/search",
+            {"query": query},
+            {"count": len(completions)}
         )
-        return completions
     except Exception as e:
-        log_api_call("GET", f"payment/transaction-completion", {"transaction_id": transaction_id}, error=e)
+        log_api_call("GET", "payment/transaction-completion/search", {"query": query}, error=e)
         raise
+
+    frappe.cache().set_value(cache_key, completions, expires_in_sec=COMPLETIONS_CACHE_TTL)
+    return completions
+
+
+def clear_transaction_completions_cache(transaction_id):
+    """Forget the cached completions of a transaction (e.g. on a completion webhook)."""
+    frappe.cache().delete_value(f"{COMPLETIONS_CACHE_KEY}:{get_space_id()}:{transaction_id}")
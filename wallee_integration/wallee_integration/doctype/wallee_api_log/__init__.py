@@ -0,0 +1,2 @@
+# Copyright (c) 2024, Your Company and contributors
+# For license information, please see license.txt
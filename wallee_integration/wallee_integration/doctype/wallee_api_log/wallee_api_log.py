@@ -0,0 +1,16 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+
+
+class WalleeAPILog(Document):
+    """Wallee API Log - calls made to the Wallee API, written in bulk by a background job."""
+
+    @staticmethod
+    def clear_old_logs(days=30):
+        table = frappe.qb.DocType("Wallee API Log")
+        frappe.db.delete(table, filters=(table.creation < (Now() - Interval(days=days))))
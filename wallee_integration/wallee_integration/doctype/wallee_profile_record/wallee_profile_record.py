@@ -0,0 +1,16 @@
+# Copyright (c) 2024, Neoservice and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+
+
+class WalleeProfileRecord(Document):
+    """Wallee Profile Record - top frames of a slow Wallee request or job (see api.profiling)."""
+
+    @staticmethod
+    def clear_old_logs(days=30):
+        table = frappe.qb.DocType("Wallee Profile Record")
+        frappe.db.delete(table, filters=(table.creation < (Now() - Interval(days=days))))
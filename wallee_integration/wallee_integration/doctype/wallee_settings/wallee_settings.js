@@ -480,7 +480,7 @@ function poll_terminal_status(dialog, transaction_name, status_div, attempts = 0
     }
 
     frappe.call({
-        method: 'wallee_integration.wallee_integration.api.pos.check_terminal_payment_status',
+        method: 'wallee_integration.wallee_integration.api.pos.get_terminal_payment_status',
         args: {
             transaction_name: transaction_name
         },
@@ -15,6 +15,11 @@ class WalleeSettings(Document):
 		if self.enable_pos_terminal and not self.pos_mode_of_payment:
 			self.pos_mode_of_payment = self._find_card_mode_of_payment()
 
+	def on_update(self):
+		# Drop cached settings and API clients so every worker picks up the change
+		from wallee_integration.wallee_integration.api.client import clear_settings_cache
+		clear_settings_cache()
+
 	def validate_credentials(self):
 		"""Validate that all required credentials are provided"""
 		if not self.user_id:
@@ -62,5 +67,6 @@ class WalleeSettings(Document):
 
 
 def get_wallee_settings():
-	"""Get Wallee Settings singleton"""
-	return frappe.get_single("Wallee Settings")
+	"""Get a cached, read-only Wallee Settings snapshot"""
+	from wallee_integration.wallee_integration.api.client import get_settings
+	return get_settings()
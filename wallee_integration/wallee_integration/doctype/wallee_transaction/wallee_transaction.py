@@ -2,10 +2,13 @@
 # Copyright (c) 2024, Neoservice and contributors
 # For license information, please see license.txt
 
+import time
+
 import frappe
 from frappe import _
+from frappe.model import no_value_fields
 from frappe.model.document import Document
-from frappe.utils import now_datetime
+from frappe.utils import get_datetime, now_datetime
 
 
 class WalleeTransaction(Document):
@@ -72,8 +75,20 @@ class WalleeTransaction(Document):
             frappe.throw(_("Failed to process refund: {0}").format(str(e)))
 
 
-def sync_transaction_status(transaction_name):
-    """Sync a single transaction status from Wallee"""
+def on_doctype_update():
+    # The scheduled sync and reports scan transactions by status, sorted by modified
+    frappe.db.add_index("Wallee Transaction", ["status", "modified"])
+
+
+def sync_transaction_status(transaction_name, priority=None):
+    """
+    Sync a single transaction status from Wallee
+
+    Args:
+        transaction_name: Wallee Transaction document name
+        priority: Rate limit priority, "interactive" when a customer waits
+            for the result (default: see get_call_priority)
+    """
     from wallee_integration.wallee_integration.api.transaction import get_full_transaction
 
     doc = frappe.get_doc("Wallee Transaction", transaction_name)
@@ -82,7 +97,7 @@ def sync_transaction_status(transaction_name):
         return
 
     try:
-        wallee_data = get_full_transaction(doc.transaction_id)
+        wallee_data = get_full_transaction(doc.transaction_id, priority=priority)
         if wallee_data:
             update_transaction_from_wallee(doc, wallee_data)
     except Exception as e:
@@ -92,6 +107,129 @@ def sync_transaction_status(transaction_name):
         )
 
 
+def sync_transactions_bulk(transactions, max_workers=8):
+    """
+    Sync many transactions from Wallee using batched search calls.
+
+    Args:
+        transactions: Wallee Transaction rows with ``name`` and ``transaction_id``,
+            as loaded by the caller (rows without a transaction ID are skipped)
+        max_workers: Maximum number of concurrent Wallee requests
+
+    When the circuit breaker opens during the run, the remaining transactions
+    are skipped with a single Error Log instead of failing one by one.
+
+    Returns:
+        dict: {total, synced, failed, failed_transactions, skipped_transactions}
+    """
+    from wallee_integration.wallee_integration.api.client import is_circuit_open
+    from wallee_integration.wallee_integration.api.transaction import fetch_transactions_in_bulk
+
+    names_by_id = {row["transaction_id"]: row["name"] for row in transactions if row["transaction_id"]}
+
+    stats = {
+        "total": len(names_by_id),
+        "synced": 0,
+        "failed": 0,
+        "failed_transactions": [],
+        "skipped_transactions": []
+    }
+
+    if not names_by_id:
+        return stats
+
+    processed = set()
+    interrupted_by = None
+    results = fetch_transactions_in_bulk(list(names_by_id), max_workers=max_workers)
+
+    try:
+        for transaction_id, wallee_data, error in results:
+            if error and is_circuit_open():
+                interrupted_by = error
+                break
+
+            processed.add(transaction_id)
+            transaction_name = names_by_id[transaction_id]
+            try:
+                if error:
+                    raise error
+
+                doc = frappe.get_doc("Wallee Transaction", transaction_name)
+                update_transaction_from_wallee(doc, wallee_data)
+                stats["synced"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                stats["failed_transactions"].append(transaction_name)
+                frappe.log_error(
+                    message=str(e),
+                    title=f"Wallee Sync Error: {transaction_name}"
+                )
+    finally:
+        results.close()
+
+    if interrupted_by:
+        stats["skipped_transactions"] = [
+            name for transaction_id, name in names_by_id.items() if transaction_id not in processed
+        ]
+        frappe.log_error(
+            message=_("Wallee became unavailable: {0} of {1} transactions were not synced and are left to a later run.\n\nLast error: {2}").format(
+                len(stats["skipped_transactions"]), stats["total"], interrupted_by
+            ),
+            title="Wallee Sync Interrupted"
+        )
+
+    return stats
+
+
+def update_transactions_from_wallee(transactions):
+    """
+    Update the local records matching a batch of Wallee transactions.
+
+    Transactions without a local record are skipped.
+
+    Args:
+        transactions: List of Transaction objects from Wallee API
+
+    Returns:
+        dict: {total, synced, failed, failed_transactions}
+    """
+    by_id = {str(tx.id): tx for tx in transactions}
+    rows = frappe.get_all(
+        "Wallee Transaction",
+        filters={"transaction_id": ["in", list(by_id)]},
+        fields=["name", "transaction_id"]
+    ) if by_id else []
+
+    stats = {"total": len(rows), "synced": 0, "failed": 0, "failed_transactions": []}
+
+    for row in rows:
+        try:
+            doc = frappe.get_doc("Wallee Transaction", row.name)
+            update_transaction_from_wallee(doc, by_id[row.transaction_id])
+            stats["synced"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            stats["failed_transactions"].append(row.name)
+            frappe.log_error(
+                message=str(e),
+                title=f"Wallee Sync Error: {row.name}"
+            )
+
+    return stats
+
+
+# Local statuses reported as a finished payment to the POS. For terminal
+# payments "Authorized" means the card was charged, so it counts as completed.
+COMPLETED_STATUSES = ["Completed", "Fulfill", "Authorized"]
+FAILED_STATUSES = ["Failed", "Decline", "Voided"]
+
+# Realtime event published to the document room on every status change
+STATUS_EVENT = "wallee_transaction_status"
+
+# Last known status per transaction, served to POS status checks
+STATUS_CACHE_KEY = "wallee_transaction_status"
+STATUS_CACHE_TTL = 3600
+
 # Mapping of Wallee states to local states
 STATUS_MAP = {
     "PENDING": "Pending",
@@ -115,6 +253,8 @@ def update_transaction_from_wallee(doc, tx):
         tx: Full transaction object from Wallee API (Transaction object, NOT dict)
              Note: SDK to_dict() truncates data, so we access attributes directly
     """
+    from wallee_integration.wallee_integration.api.transaction import clear_transaction_completions_cache
+
     # Helper to safely get attribute from object or dict
     def get_attr(obj, attr, default=None):
         if obj is None:
@@ -141,6 +281,20 @@ def update_transaction_from_wallee(doc, tx):
             return dt.replace(tzinfo=None)
         return dt
 
+    # Wallee increments the version on every change of the transaction, so
+    # there is nothing to write when it matches the one already stored
+    version = get_attr(tx, "version")
+    if version is not None and version == _get_stored_version(doc):
+        cache_transaction_status(doc, get_enum_value(get_attr(tx, "state")))
+        return
+
+    # The transaction changed, possibly completed without a completion webhook
+    clear_transaction_completions_cache(doc.transaction_id)
+
+    # Snapshot the current values to only write what changed
+    values_before = _get_row_values(doc)
+    items_before = [_get_row_values(item) for item in doc.get("items")]
+
     # Save old status to detect transitions
     old_status = doc.status
 
@@ -329,10 +483,28 @@ def update_transaction_from_wallee(doc, tx):
 
     doc.wallee_data = frappe.as_json(raw_data)
 
-    doc.flags.ignore_validate = True
-    doc.save(ignore_permissions=True)
+    if [_get_row_values(item) for item in doc.get("items")] != items_before:
+        # Line items are replaced as a whole, which needs a full save
+        doc.flags.ignore_validate = True
+        doc.save(ignore_permissions=True)
+    else:
+        values_after = _get_row_values(doc)
+        changed = {
+            fieldname: doc.get(fieldname)
+            for fieldname, value in values_after.items()
+            if value != values_before.get(fieldname)
+        }
+        if changed:
+            doc.db_set(changed)
+
+    if new_status != old_status:
+        publish_transaction_status(doc, get_enum_value(state))
+        _observe_time_to_authorize(doc, old_status)
+
     frappe.db.commit()
 
+    cache_transaction_status(doc, get_enum_value(state))
+
     # After save: manage invoice if transaction just completed
     if new_status in ["Completed", "Fulfill"] and old_status != new_status:
         frappe.enqueue(
@@ -343,6 +515,90 @@ def update_transaction_from_wallee(doc, tx):
         )
 
 
+def get_transaction_status_payload(doc, wallee_state=None):
+    """Status of a transaction as reported to the POS client."""
+    return {
+        "success": True,
+        "transaction_name": doc.name,
+        "transaction_id": doc.transaction_id,
+        "status": doc.status,
+        "wallee_state": wallee_state,
+        "amount": doc.amount,
+        "currency": doc.currency,
+        "completed": doc.status in COMPLETED_STATUSES,
+        "failed": doc.status in FAILED_STATUSES,
+        "failure_reason": doc.failure_reason
+    }
+
+
+def publish_transaction_status(doc, wallee_state=None):
+    """
+    Push the transaction status to clients subscribed to the document.
+
+    Sent once the current transaction commits, so clients never see a
+    status that was rolled back.
+    """
+    frappe.publish_realtime(
+        STATUS_EVENT,
+        get_transaction_status_payload(doc, wallee_state),
+        doctype=doc.doctype,
+        docname=doc.name,
+        after_commit=True
+    )
+
+
+def cache_transaction_status(doc, wallee_state=None):
+    """Remember the status just read from Wallee for cheap status checks."""
+    status = get_transaction_status_payload(doc, wallee_state)
+    status["cached_at"] = time.time()
+
+    frappe.cache().set_value(
+        f"{STATUS_CACHE_KEY}:{doc.name}", status, expires_in_sec=STATUS_CACHE_TTL
+    )
+
+
+def get_cached_transaction_status(transaction_name):
+    """
+    Get the last status cached for a transaction.
+
+    Returns:
+        dict: Status payload with its ``cached_at`` timestamp, or None
+    """
+    return frappe.cache().get_value(f"{STATUS_CACHE_KEY}:{transaction_name}")
+
+
+def _observe_time_to_authorize(doc, old_status):
+    """Record how long a terminal payment took from creation to authorization."""
+    from wallee_integration.wallee_integration.api.metrics import observe
+
+    if doc.transaction_type != "Terminal" or old_status in COMPLETED_STATUSES:
+        return
+
+    if doc.status in COMPLETED_STATUSES:
+        seconds = (now_datetime() - get_datetime(doc.creation)).total_seconds()
+        observe("wallee_pos_time_to_authorize_seconds", seconds)
+
+
+def _get_stored_version(doc):
+    """Get the Wallee version of the transaction data stored on the document."""
+    if not doc.wallee_data:
+        return None
+
+    try:
+        return (frappe.parse_json(doc.wallee_data) or {}).get("version")
+    except ValueError:
+        return None
+
+
+def _get_row_values(row):
+    """Get the field values of a document or child row, empty values as None."""
+    return {
+        df.fieldname: row.get(df.fieldname) or None
+        for df in row.meta.fields
+        if df.fieldtype not in no_value_fields
+    }
+
+
 def _update_card_details(doc, tx):
     """Extract and update card details from transaction data."""
     # Helper to safely get attribute from object or dict
@@ -521,4 +777,7 @@ def create_transaction_record(
     doc.insert(ignore_permissions=True)
     frappe.db.commit()
 
+    # Seed the status cache, so the first POS polls are not sent to Wallee
+    cache_transaction_status(doc)
+
     return doc
@@ -34,6 +34,7 @@ frappe.ui.form.on('Wallee Webhook Log', {
 function get_log_status_color(status) {
     const colors = {
         'Received': 'blue',
+        'Queued': 'orange',
         'Processed': 'green',
         'Failed': 'red',
         'Ignored': 'grey'
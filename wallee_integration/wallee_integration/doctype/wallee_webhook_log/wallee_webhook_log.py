@@ -22,7 +22,8 @@ def create_webhook_log(
     processing_status="Received",
     http_status=None,
     error_message=None,
-    linked_transaction=None
+    linked_transaction=None,
+    event_key=None
 ):
     """
     Create a webhook log entry.
@@ -35,10 +36,11 @@ def create_webhook_log(
         listener_entity_id: Webhook listener ID
         request_headers: HTTP headers as dict
         request_payload: Request body as dict
-        processing_status: Received/Processed/Failed/Ignored
+        processing_status: Received/Queued/Processed/Failed/Ignored
         http_status: HTTP response code
         error_message: Error message if failed
         linked_transaction: Link to Wallee Transaction document
+        event_key: Unique identity of the Wallee event, used for de-duplication
 
     Returns:
         WalleeWebhookLog: The created log document
@@ -55,6 +57,7 @@ def create_webhook_log(
     log.http_status = http_status
     log.error_message = error_message
     log.linked_transaction = linked_transaction
+    log.event_key = event_key
 
     log.flags.ignore_permissions = True
     log.insert()
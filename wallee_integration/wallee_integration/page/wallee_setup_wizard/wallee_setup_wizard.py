@@ -5,12 +5,13 @@
 import frappe
 from frappe import _
 import json
+from wallee_integration.wallee_integration.api.client import get_settings
 
 
 @frappe.whitelist()
 def get_current_settings():
     """Get current Wallee settings if any"""
-    settings = frappe.get_single("Wallee Settings")
+    settings = get_settings()
     return {
         "user_id": settings.user_id or "",
         "space_id": settings.space_id or "",
@@ -50,7 +51,7 @@ def test_connection():
         from wallee import TransactionsService
         from wallee.configuration import Configuration
 
-        settings = frappe.get_single("Wallee Settings")
+        settings = get_settings()
 
         if not settings.user_id or not settings.authentication_key or not settings.space_id:
             return {
@@ -111,7 +112,7 @@ def test_transaction_creation():
         from wallee import TransactionsService, LineItemCreate, TransactionCreate, LineItemType
         from wallee.configuration import Configuration
 
-        settings = frappe.get_single("Wallee Settings")
+        settings = get_settings()
 
         config = Configuration(
             user_id=int(settings.user_id),
@@ -309,6 +310,7 @@ def create_dedicated_users(enable_webshop=False, enable_pos_terminal=False):
         AccountsService
     )
 
+    # Updated and saved below, so not the read-only cached snapshot
     settings = frappe.get_single("Wallee Settings")
 
     if not settings.user_id or not settings.authentication_key:
@@ -454,7 +456,7 @@ def fix_user_permissions():
         AccountsService
     )
 
-    settings = frappe.get_single("Wallee Settings")
+    settings = get_settings()
 
     if not settings.user_id or not settings.authentication_key:
         return {
@@ -5,6 +5,7 @@
 import frappe
 from frappe import _
 import json
+from wallee_integration.wallee_integration.api.client import get_settings
 
 
 @frappe.whitelist()
@@ -514,7 +515,7 @@ def import_terminals(terminals):
 @frappe.whitelist()
 def get_wizard_defaults():
 	"""Get default configuration and location if set"""
-	settings = frappe.get_single("Wallee Settings")
+	settings = get_settings()
 
 	default_config = None
 	default_location = None